@@ -16,14 +16,10 @@ Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
 import numpy as np
 
-
-def compute_rem(graph, samples, configuration, weights):
-    current_outputs = [ graph.evaluate(sample["input"], configuration) for sample in samples ]  #compute the output of the circuit for each of the samples
-    rem = 0.0
-    for sample, current in zip(samples, current_outputs):
-        f_exact = np.sum([float(weights[o]) * sample["output"][o] for o in weights.keys() ]) # compute f(x), from the circuit output
-        f_apprx = np.sum([float(weights[o]) * current[o] for o in weights.keys() ])          # compute the same, but for the approximate circuit
-        err = np.abs(1 - (f_apprx + 1) / (f_exact + 1))                                      # computing the relative error
-        if rem < err:                                                                        # keeping track of the maximum
-            rem = err
-        return float(rem)
+# Relative error magnitude. To be used with "max" reduction, i.e.,
+# "metrics" : [{"module": "metrics/relative_error_magnitude.py", "function": "compute_rem", "reduction": "max"}]
+# outputs is an OutputSet, i.e., exact and approximate outputs of (a chunk of) the samples, as numpy arrays.
+def compute_rem(outputs, weights):
+    f_exact = outputs.exact_values(weights)   # f(x), from the outputs of the exact circuit, one value per sample
+    f_apprx = outputs.approx_values(weights)  # the same, but for the approximate circuit
+    return np.abs(1 - (f_apprx + 1) / (f_exact + 1))
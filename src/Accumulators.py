@@ -0,0 +1,106 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import numpy as np
+
+class MaxAccumulator:
+    """
+    Running maximum of a per-sample error quantity (AWCE, WRE). The maximum can only grow as more samples are
+    evaluated, hence the running value is a proven lower bound of the final one.
+    """
+    def __init__(self):
+        self.n = 0
+        self.max = -np.inf
+
+    def update(self, values):
+        if len(values):
+            self.n += len(values)
+            self.max = max(self.max, float(np.max(values)))
+
+    def merge(self, other):
+        self.n += other.n
+        self.max = max(self.max, other.max)
+
+    def value(self):
+        return self.max
+
+    def lower_bound(self, total, z):
+        return self.max
+
+
+class MeanAccumulator:
+    """
+    Running mean of a per-sample error quantity, kept as (n, mean, M2) so that partial results can be merged
+    (Chan et al.). The final metric is transform(mean), transform being monotonically non-decreasing.
+    The lower bound of the final value is
+     - sum / total, which is proven if the quantity is non-negative, since the remaining samples cannot decrease it;
+     - mean - z * stderr, with finite-population correction, which holds with the confidence z stands for.
+    """
+    min_samples = 30
+
+    def __init__(self, nonnegative = False, transform = None):
+        self.nonnegative = nonnegative
+        self.transform = transform
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+
+    def update(self, values):
+        other = MeanAccumulator()
+        other.n = len(values)
+        if other.n:
+            other.mean = float(np.mean(values))
+            other.M2 = float(np.sum((np.asarray(values, dtype = float) - other.mean) ** 2))
+            self.merge(other)
+
+    def merge(self, other):
+        n = self.n + other.n
+        if n == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.M2 += other.M2 + delta ** 2 * self.n * other.n / n
+        self.n = n
+
+    def finalize(self, value):
+        return self.transform(value) if self.transform is not None else value
+
+    def value(self):
+        return self.finalize(self.mean)
+
+    def variance(self):
+        return self.M2 / self.n if self.n else 0.0
+
+    def lower_bound(self, total, z):
+        bounds = [-np.inf]
+        if self.nonnegative:
+            bounds.append(self.mean * self.n / total)
+        if self.n >= self.min_samples and total > 1:
+            fpc = np.sqrt(max(0, total - self.n) / (total - 1))
+            bounds.append(self.mean - z * np.sqrt(self.M2 / (self.n - 1) / self.n) * fpc)
+        bound = max(bounds)
+        return self.finalize(max(bound, 0) if self.nonnegative else bound) if np.isfinite(bound) else -np.inf
+
+
+class VarianceAccumulator(MeanAccumulator):
+    """
+    Running (population) variance of a per-sample quantity. It never allows early termination.
+    """
+    def value(self):
+        return self.variance()
+
+    def lower_bound(self, total, z):
+        return -np.inf
@@ -0,0 +1,179 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import os, threading, traceback, pyamosa, numpy as np
+from pyamosa.StochasticHillClimbing import StochasticHillClimbing
+
+class Archive(pyamosa.Pareto):
+    """
+    Pareto archive stored as a compressed NumPy archive (.npz), holding the x, f and g arrays of candidate solutions,
+    instead of a Json5 file. Json archives, e.g., from previous runs, can still be read.
+    """
+    @staticmethod
+    def to_arrays(candidate_solutions):
+        arrays = {"x": np.array([s["x"] for s in candidate_solutions]), "f": np.array([s["f"] for s in candidate_solutions], dtype = float)}
+        if all(s["g"] is not None for s in candidate_solutions):
+            arrays["g"] = np.array([s["g"] for s in candidate_solutions], dtype = float)
+        return arrays
+
+    @staticmethod
+    def from_arrays(problem, arrays):
+        if all(t == pyamosa.Type.INTEGER for t in problem.types):
+            x = arrays["x"].astype(int).tolist()
+        else:
+            x = [[int(i) if t == pyamosa.Type.INTEGER else float(i) for i, t in zip(a, problem.types)] for a in arrays["x"].tolist()]
+        f = arrays["f"].tolist()
+        g = arrays["g"].tolist() if "g" in arrays else [None] * len(x)
+        return [{"x": a, "f": b, "g": c} for a, b, c in zip(x, f, g)]
+
+    @staticmethod
+    def save(file, arrays):
+        """
+        Atomically writes arrays to file: a reader either finds the previous content, or the new one.
+        """
+        with open(f"{file}.tmp", "wb") as outfile:
+            np.savez_compressed(outfile, **arrays)
+        os.replace(f"{file}.tmp", file)
+
+    def write(self, file):
+        Archive.save(file, Archive.to_arrays(self.candidate_solutions))
+
+    def read(self, problem, file):
+        if file.endswith(".json") or file.endswith(".json5"):
+            self.read_json(problem, file)
+        else:
+            with np.load(file) as arrays:
+                self.candidate_solutions = Archive.from_arrays(problem, arrays)
+
+class AsyncWriter:
+    """
+    Writes arrays to files from a background thread, so that the caller does not wait for serialization. Only the
+    latest arrays submitted for a given file are written, older ones being superseded.
+    """
+    def __init__(self):
+        self.pending = {}
+        self.thread = None
+        self.cv = threading.Condition()
+
+    def submit(self, file, arrays):
+        with self.cv:
+            self.pending[file] = arrays
+            if self.thread is None:
+                self.thread = threading.Thread(target = self.loop, name = "checkpoint-writer")
+                self.thread.start()
+
+    def loop(self):
+        while True:
+            with self.cv:
+                if not self.pending:
+                    self.thread = None
+                    self.cv.notify_all()
+                    return
+                file = next(iter(self.pending))
+                arrays = self.pending.pop(file)
+            try:
+                Archive.save(file, arrays)
+            except Exception:
+                traceback.print_exc()
+
+    def flush(self):
+        with self.cv:
+            while self.thread is not None:
+                self.cv.wait()
+
+class HillClimbing(StochasticHillClimbing):
+    def __init__(self, problem, pareto, checkpoint_file, writer):
+        super().__init__(problem, pareto, checkpoint_file)
+        self.writer = writer
+
+    def save_checkpoint(self):
+        self.writer.submit(self.checkpoint_file, Archive.to_arrays(self.pareto.candidate_solutions))
+
+    def read_checkpoint(self):
+        with np.load(self.checkpoint_file) as arrays:
+            self.pareto.candidate_solutions = Archive.from_arrays(self.problem, arrays)
+
+class BinaryCheckpoints:
+    """
+    Makes a pyamosa optimizer use the Archive class, and store its checkpoints as NumPy archives, written in background
+    by an AsyncWriter, so that annealing does not stall while the archive is being serialized.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer = AsyncWriter()
+
+    def bootstrap(self, problem):
+        super().bootstrap(problem)
+        self.archive = Archive()
+
+    def initial_stage(self, problem, improve, remove_checkpoints):
+        climber = HillClimbing(problem, self.archive, self.config.hill_climb_checkpoint_file, self.writer)
+        if os.path.exists(self.config.minimize_checkpoint_file):
+            print(f"Recovering Annealing from {self.config.minimize_checkpoint_file}")
+            self.read_checkpoint(problem)
+            problem.archive_to_cache(self.archive)
+        else:
+            if improve is not None:
+                print(f"Reading {improve}, and trying to improve a previous run...")
+                self.archive.read(problem, improve)
+                problem.archive_to_cache(self.archive)
+            elif os.path.exists(self.config.hill_climb_checkpoint_file):
+                print(f"Recovering Hill-climbing from {self.config.hill_climb_checkpoint_file}")
+                climber.read_checkpoint()
+                print(f"Recovered {self.archive.size()} candidate solutions")
+            else:
+                climber.init()
+            self.run_hill_climbing(climber, problem)
+            self.writer.flush()
+            if remove_checkpoints and os.path.exists(self.config.hill_climb_checkpoint_file):
+                os.remove(self.config.hill_climb_checkpoint_file)
+        assert self.archive.size() > 0, "Archive not initialized"
+
+    def annealing_loop(self, problem, termination_criterion):
+        super().annealing_loop(problem, termination_criterion)
+        self.writer.flush()
+
+    def save_checkpoint(self):
+        checkpoint = {
+            "n_eval": np.array(self.n_eval),
+            "t": np.array(self.current_temperature),
+            "ideal": np.array(self.archive.ideal if self.archive.ideal is not None else [], dtype = float),
+            "nadir": np.array(self.archive.nadir if self.archive.nadir is not None else [], dtype = float),
+            "norm": np.array(self.archive.old_norm_objectives, dtype = float),
+            "phy": np.array(self.archive.phy, dtype = float)}
+        self.writer.submit(self.config.minimize_checkpoint_file, checkpoint | Archive.to_arrays(self.archive.candidate_solutions))
+
+    def read_checkpoint(self, problem):
+        with np.load(self.config.minimize_checkpoint_file) as checkpoint:
+            self.n_eval = int(checkpoint["n_eval"])
+            self.current_temperature = float(checkpoint["t"])
+            self.archive.ideal = checkpoint["ideal"].tolist() if checkpoint["ideal"].size else None
+            self.archive.nadir = checkpoint["nadir"].tolist() if checkpoint["nadir"].size else None
+            self.archive.old_norm_objectives = checkpoint["norm"]
+            self.archive.phy = checkpoint["phy"].tolist()
+            self.archive.candidate_solutions = Archive.from_arrays(problem, checkpoint)
+
+class Optimizer(BinaryCheckpoints, pyamosa.Optimizer):
+    pass
+
+class DynamicRandomGroupingOptimizer(BinaryCheckpoints, pyamosa.DynamicRandomGroupingOptimizer):
+    pass
+
+class GenericGroupingOptimizer(BinaryCheckpoints, pyamosa.GenericGroupingOptimizer):
+    def initial_stage(self, problem, improve, remove_checkpoints):
+        print("Initializing Variable Grouping")
+        self.init_variable_grouping()
+        super().initial_stage(problem, improve, remove_checkpoints)
@@ -0,0 +1,240 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import pickle, threading, time, uuid, os, socket, collections
+from multiprocessing.managers import BaseManager
+from tqdm import tqdm
+
+# broker (or proxy to it) of the current process; RemoteObject handles resolve through it
+_broker = None
+
+class BrokerState:
+    """
+    Task queue, results and shared objects of a distributed evaluation. It lives in the process running the DSE, and
+    remote workers reach it through a multiprocessing.managers server. Tasks fetched by a worker that stops sending
+    heartbeats, or that leaves, are queued again, up to max_attempts times.
+    """
+    def __init__(self, heartbeat_timeout = 30, max_attempts = 3):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.condition = threading.Condition()
+        self.pending = collections.deque()
+        self.inflight = {}
+        self.attempts = {}
+        self.results = {}
+        self.blobs = {}
+        self.workers = {}
+        self.closed = False
+
+    def join(self, worker):
+        with self.condition:
+            self.workers[worker] = time.time()
+        print(f"Worker {worker} joined")
+
+    def leave(self, worker):
+        with self.condition:
+            self.workers.pop(worker, None)
+            for task_id in [t for t, (w, _) in self.inflight.items() if w == worker]:
+                _, payload = self.inflight.pop(task_id)
+                self.retry(task_id, payload, f"worker {worker} left")
+            self.condition.notify_all()
+        print(f"Worker {worker} left")
+
+    def heartbeat(self, worker):
+        with self.condition:
+            if worker in self.workers:
+                self.workers[worker] = time.time()
+            return not self.closed
+
+    def reap(self):
+        with self.condition:
+            now = time.time()
+            for worker in [w for w, t in self.workers.items() if now - t > self.heartbeat_timeout]:
+                self.leave(worker)
+
+    def num_workers(self):
+        return len(self.workers)
+
+    def put_blob(self, key, data):
+        self.blobs[key] = data
+
+    def get_blob(self, key):
+        return self.blobs[key]
+
+    def submit(self, task_id, payload):
+        with self.condition:
+            self.pending.append((task_id, payload))
+            self.condition.notify_all()
+
+    def retry(self, task_id, payload, reason):
+        self.attempts[task_id] = self.attempts.get(task_id, 1) + 1
+        if self.attempts[task_id] > self.max_attempts:
+            self.results[task_id] = (False, pickle.dumps(RuntimeError(f"Task {task_id} failed {self.max_attempts} times, last time because {reason}")))
+        else:
+            self.pending.appendleft((task_id, payload))
+
+    def fetch(self, worker, timeout):
+        with self.condition:
+            if worker not in self.workers:
+                # unknown, or reaped: its tasks were queued again, and it must join again
+                return False
+            self.workers[worker] = time.time()
+            if not self.condition.wait_for(lambda: self.pending or self.closed, timeout) or self.closed:
+                return None
+            task_id, payload = self.pending.popleft()
+            self.inflight[task_id] = (worker, payload)
+            return task_id, payload
+
+    def complete(self, worker, task_id, ok, payload):
+        with self.condition:
+            if worker not in self.workers:
+                return
+            self.workers[worker] = time.time()
+            if task_id in self.inflight and self.inflight[task_id][0] == worker:
+                del self.inflight[task_id]
+                self.attempts.pop(task_id, None)
+                self.results[task_id] = (ok, payload)
+                self.condition.notify_all()
+
+    def collect(self, task_ids, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: any(t in self.results for t in task_ids), timeout)
+            return {t: self.results.pop(t) for t in task_ids if t in self.results}
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class BrokerManager(BaseManager):
+    pass
+
+
+class RemoteObject:
+    """
+    Any picklable object, stored once by the broker, fetched and unpickled at most once per worker process.
+    """
+    _objects = {}
+
+    def __init__(self, key):
+        self.key = key
+
+    def get(self):
+        if self.key not in RemoteObject._objects:
+            RemoteObject._objects[self.key] = pickle.loads(_broker.get_blob(self.key))
+        return RemoteObject._objects[self.key]
+
+
+class Broker:
+    """
+    Drop-in replacement for WorkerPool dispatching tasks to remote workers (see run_worker), which may join and leave
+    at any time. ncpus is the number of tasks each map is split into, hence it should match the total number of
+    remote worker processes.
+    """
+    def __init__(self, address, authkey, ncpus, heartbeat_timeout = 30):
+        global _broker
+        self.ncpus = ncpus
+        self.state = BrokerState(heartbeat_timeout)
+        _broker = self.state
+        BrokerManager.register("broker", callable = lambda: self.state)
+        host, port = address.rsplit(":", 1)
+        self.server = BrokerManager(address = (host, int(port)), authkey = authkey.encode()).get_server()
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+        print(f"Broker listening on {host}:{self.server.address[1]}")
+
+    def share(self, obj):
+        key = uuid.uuid4().hex
+        self.state.put_blob(key, pickle.dumps(obj, protocol = pickle.HIGHEST_PROTOCOL))
+        return RemoteObject(key)
+
+    def starmap(self, function, args):
+        return list(self.imap(function, args))
+
+    def imap(self, function, args):
+        task_ids = [uuid.uuid4().hex for _ in args]
+        for task_id, a in zip(task_ids, args):
+            self.state.submit(task_id, pickle.dumps((function, a), protocol = pickle.HIGHEST_PROTOCOL))
+        results = {}
+        waiting = time.time()
+        for task_id in task_ids:
+            while task_id not in results:
+                self.state.reap()
+                if self.state.num_workers() == 0 and waiting is not None and time.time() - waiting > 10:
+                    tqdm.write("Waiting for workers to join the broker...")
+                    waiting = None
+                results |= self.state.collect([t for t in task_ids if t not in results], 1)
+            ok, payload = results.pop(task_id)
+            value = pickle.loads(payload)
+            if not ok:
+                raise value
+            yield value
+
+    def close(self):
+        self.state.close()
+
+
+def run_worker(address, authkey, heartbeat_period = 5):
+    """
+    Worker loop: connects to the broker, then runs tasks until the broker closes or goes away.
+    """
+    global _broker
+    host, port = address.rsplit(":", 1)
+    manager = BrokerManager(address = (host, int(port)), authkey = authkey.encode())
+    BrokerManager.register("broker")
+    manager.connect()
+    _broker = manager.broker()
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    _broker.join(worker)
+    stop = threading.Event()
+
+    def heartbeat():
+        # proxies open a connection per thread
+        while not stop.wait(heartbeat_period):
+            try:
+                if not _broker.heartbeat(worker):
+                    stop.set()
+            except (EOFError, OSError):
+                stop.set()
+
+    threading.Thread(target = heartbeat, daemon = True).start()
+    try:
+        while not stop.is_set():
+            task = _broker.fetch(worker, heartbeat_period)
+            if task is False:
+                print(f"Worker {worker}: the broker dropped this worker, joining again")
+                _broker.join(worker)
+                continue
+            if task is None:
+                continue
+            task_id, payload = task
+            try:
+                function, args = pickle.loads(payload)
+                result = (True, pickle.dumps(function(*args), protocol = pickle.HIGHEST_PROTOCOL))
+            except Exception as e:
+                try:
+                    result = (False, pickle.dumps(e))
+                except Exception:
+                    result = (False, pickle.dumps(RuntimeError(repr(e))))
+            _broker.complete(worker, task_id, *result)
+    except (EOFError, OSError):
+        print(f"Worker {worker}: broker went away")
+    finally:
+        stop.set()
+        try:
+            _broker.leave(worker)
+        except (EOFError, OSError):
+            pass
@@ -0,0 +1,81 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import sqlite3, json, itertools, pathlib
+from pyalslib import negate, string_to_nested_list_int
+
+class CatalogQuery:
+    """
+    Answers batches of (spec, dist, neg) queries over a single read-only connection to the catalog cache.
+    Queries are loaded into a temporary table and resolved with two joins (direct and complemented spec), so each
+    batch costs a couple of SELECTs regardless of its size. Semantics are the same of ALSCatalogCache.get_lut_at_dist.
+    """
+    __select = "select q.id, l.synth_spec, l.S, l.P, l.out_p, l.out, l.depth from queries q join luts l on l.spec = q.{} and l.distance = q.distance"
+
+    def __init__(self, cache_file, batch_size = 10000):
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(pathlib.Path(cache_file).absolute().as_uri() + "?mode=ro", uri = True)
+        self.connection.execute("create temp table queries (id integer primary key, spec text, nspec text, distance integer)")
+
+    def __del__(self):
+        self.connection.close()
+
+    def query(self, queries):
+        queries = iter(queries)
+        while batch := list(itertools.islice(queries, self.batch_size)):
+            yield from self.query_batch(batch)
+
+    def query_batch(self, batch):
+        rows = [(i, spec, negate(spec), int(dist)) for i, (spec, dist) in enumerate(batch)]
+        cursor = self.connection.cursor()
+        cursor.execute("delete from queries")
+        cursor.executemany("insert into queries (id, spec, nspec, distance) values (?, ?, ?, ?)", rows)
+        results = [None] * len(batch)
+        for qid, synth_spec, S, P, out_p, out, depth in cursor.execute(self.__select.format("nspec")):
+            results[qid] = (negate(synth_spec), string_to_nested_list_int(S), string_to_nested_list_int(P), 1 - out_p, out, depth)
+        for qid, synth_spec, S, P, out_p, out, depth in cursor.execute(self.__select.format("spec")):
+            results[qid] = (synth_spec, string_to_nested_list_int(S), string_to_nested_list_int(P), out_p, out, depth)
+        return results
+
+    @staticmethod
+    def parse_queries(stream):
+        """
+        Each (non-empty) line is either a JSON object {"spec": ..., "dist": ..., "neg": ...} or a whitespace-separated
+        "spec [dist] [neg]" triple. Yields (spec, dist, neg) tuples.
+        """
+        for line in stream:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                q = json.loads(line)
+                yield q["spec"], int(q.get("dist", 0)), bool(q.get("neg", False))
+            else:
+                fields = line.split()
+                yield fields[0], int(fields[1]) if len(fields) > 1 else 0, len(fields) > 2 and fields[2].lower() in ("1", "true", "neg")
+
+    def answer(self, stream, out):
+        queries, pending = itertools.tee(CatalogQuery.parse_queries(stream))
+        results = self.query((negate(spec) if neg else spec, dist) for spec, dist, neg in queries)
+        count = 0
+        for (spec, dist, neg), result in zip(pending, results):
+            item = {"spec": spec, "dist": dist, "neg": neg, "found": result is not None}
+            if result is not None:
+                item |= dict(zip(("synth_spec", "S", "P", "out_p", "out", "depth"), result))
+            out.write(json.dumps(item) + "\n")
+            count += 1
+        out.flush()
+        return count
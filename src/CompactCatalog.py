@@ -0,0 +1,187 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import functools, copy, collections.abc, numpy as np
+
+class LutConfiguration:
+    """
+    Implementation of a LUT within a configuration (see MOP.matter_configuration()). Fields are read either as
+    attributes or as items, i.e., c.axspec or c["axspec"]; S and P are views of the arrays of the catalog.
+    """
+    __slots__ = ("dist", "spec", "axspec", "gates", "S", "P", "out_p", "out", "depth")
+
+    def __init__(self, dist, spec, axspec, gates, S, P, out_p, out, depth):
+        self.dist = dist
+        self.spec = spec
+        self.axspec = axspec
+        self.gates = gates
+        self.S = S
+        self.P = P
+        self.out_p = out_p
+        self.out = out
+        self.depth = depth
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+class LazyConfiguration(collections.abc.Mapping):
+    """
+    Configuration as sent to workers: handles to a catalog and to the (name, spec) of the cells, both in shared memory
+    (or held by the broker), and the distance of each cell. Records are built on first access, by the worker.
+    """
+    def __init__(self, catalog, cells, x):
+        self.catalog = catalog
+        self.cells = cells
+        self.x = x
+        self.records = None
+
+    def __getstate__(self):
+        return {"catalog": self.catalog, "cells": self.cells, "x": self.x, "records": None}
+
+    def get(self):
+        if self.records is None:
+            catalog = self.catalog.get()
+            self.records = {name: catalog.configuration(spec, d) for (name, spec), d in zip(self.cells.get(), self.x)}
+        return self.records
+
+    def __getitem__(self, name):
+        return self.get()[name]
+
+    def __iter__(self):
+        return iter(self.get())
+
+    def __len__(self):
+        return len(self.x)
+
+
+class CompactCatalog:
+    """
+    Columnar representation of a catalog (one list of entries per LUT specification, as returned by
+    ALSCatalog.generate_catalog). Entries of LUT l are rows offsets[l] to offsets[l + 1] of each column:
+     - truth tables are bitsets, bit i of tables[e] being the output of entry e for the input pattern i;
+     - gates, depth, out_p and out are one value per entry;
+     - the AIG of entry e is made of columns nodes[e] to nodes[e + 1] of S and P, i.e., of its gates.
+    Specifications of cells are looked up, together with their negation, in a dictionary, rather than by scanning the
+    catalog. Columns are plain arrays, so that the catalog can be placed in shared memory (see SharedCatalog), and
+    attached read-only by workers.
+    """
+    columns = ("offsets", "widths", "tables", "gates", "depth", "out_p", "out", "nodes", "S", "P")
+
+    def __init__(self, catalog):
+        # the version is read first: entries added meanwhile (see StreamingCatalog) make the catalog stale
+        self.version = getattr(catalog, "version", None)
+        luts = [list(entries) for entries in catalog]
+        entries = [e for lut in luts for e in lut]
+        rows = CompactCatalog.encode_entries(entries, max([(len(e["spec"]) + 63) // 64 for e in entries], default = 1))
+        self.offsets = np.cumsum([0] + [len(lut) for lut in luts], dtype = np.int64)
+        self.nodes = np.concatenate([[0], np.cumsum(rows.pop("sizes"))]).astype(np.int64)
+        for name, column in rows.items():
+            setattr(self, name, column)
+        self.index = CompactCatalog.make_index(self.offsets, self.widths, self.tables)
+
+    @staticmethod
+    def encode_entries(entries, words):
+        return {
+            "widths": np.array([len(e["spec"]) for e in entries], dtype = np.int32),
+            "tables": np.array([CompactCatalog.encode(e["spec"], words) for e in entries], dtype = np.uint64).reshape(len(entries), words),
+            "gates": np.array([e["gates"] for e in entries], dtype = np.int32),
+            "depth": np.array([e["depth"] for e in entries], dtype = np.int32),
+            "out_p": np.array([e["out_p"] for e in entries], dtype = np.uint8),
+            "out": np.array([e["out"] for e in entries], dtype = np.int32),
+            "sizes": np.array([len(e["S"][0]) for e in entries], dtype = np.int64),
+            "S": np.array([[s for e in entries for s in e["S"][c]] for c in (0, 1)], dtype = np.int32).reshape(2, -1),
+            "P": np.array([[p for e in entries for p in e["P"][c]] for c in (0, 1)], dtype = np.uint8).reshape(2, -1)}
+
+    def extend(self, catalog):
+        """
+        Returns a copy of this catalog, including the entries added to catalog (the one this was compacted from, e.g., a
+        StreamingCatalog) since. Only new entries are encoded, then inserted at the end of their LUT; LUTs, hence the
+        specification index, do not change.
+        """
+        catalog_version = getattr(catalog, "version", None)
+        added = [entries[int(self.offsets[l + 1] - self.offsets[l]):] for l, entries in enumerate(catalog)]
+        extended = copy.copy(self)
+        extended.version = catalog_version
+        entries = [e for new in added for e in new]
+        if not entries:
+            return extended
+        rows = CompactCatalog.encode_entries(entries, self.tables.shape[1])
+        # rows (and gates) of the new entries of LUT l go before the first row (and gate) of LUT l + 1
+        positions = np.repeat(self.offsets[1:], [len(new) for new in added])
+        for name in ("S", "P"):
+            setattr(extended, name, np.insert(getattr(self, name), np.repeat(self.nodes[positions], rows["sizes"]), rows[name], axis = 1))
+        for name in ("widths", "tables", "gates", "depth", "out_p", "out"):
+            setattr(extended, name, np.insert(getattr(self, name), positions, rows[name], axis = 0))
+        extended.offsets = np.concatenate([[0], np.cumsum(np.diff(self.offsets) + [len(new) for new in added])]).astype(np.int64)
+        extended.nodes = np.concatenate([[0], np.cumsum(np.insert(np.diff(self.nodes), positions, rows["sizes"]))]).astype(np.int64)
+        return extended
+
+    @staticmethod
+    def from_columns(columns, version = None):
+        catalog = CompactCatalog.__new__(CompactCatalog)
+        catalog.version = version
+        for name in CompactCatalog.columns:
+            view = columns[name].view()
+            view.flags.writeable = False
+            setattr(catalog, name, view)
+        catalog.index = CompactCatalog.make_index(catalog.offsets, catalog.widths, catalog.tables)
+        return catalog
+
+    @staticmethod
+    def make_index(offsets, widths, tables):
+        # specification of a cell -> (LUT, negated); exact specifications win over negated ones
+        index = {}
+        for l, e in enumerate(offsets[:-1]):
+            spec = CompactCatalog.decode(tables[e].tobytes(), int(widths[e]))
+            index[spec] = (l, False)
+        for l, e in enumerate(offsets[:-1]):
+            index.setdefault(CompactCatalog.decode(tables[e].tobytes(), int(widths[e]), True), (l, True))
+        return index
+
+    @staticmethod
+    def encode(spec, words):
+        table = int(spec[::-1], 2) if spec else 0
+        return [(table >> (64 * k)) & 0xffffffffffffffff for k in range(words)]
+
+    @staticmethod
+    @functools.lru_cache(maxsize = None)
+    def decode(table, width, negated = False):
+        table = int.from_bytes(table, "little")
+        if negated:
+            table ^= (1 << width) - 1
+        return format(table & ((1 << width) - 1), f"0{width}b")[::-1] if width else ""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def entries(self, spec):
+        """
+        Returns the number of entries of the LUT implementing spec, or its negation.
+        """
+        l, _ = self.index[spec]
+        return int(self.offsets[l + 1] - self.offsets[l])
+
+    def configuration(self, spec, dist):
+        """
+        Returns the implementation of spec at distance dist, as a LutConfiguration.
+        """
+        l, negated = self.index[spec]
+        if dist >= self.offsets[l + 1] - self.offsets[l]:
+            raise IndexError(f"{spec} has {self.offsets[l + 1] - self.offsets[l]} catalog entries, while entry {dist} is required")
+        e = self.offsets[l] + dist
+        begin, end = self.nodes[e], self.nodes[e + 1]
+        return LutConfiguration(dist, spec, CompactCatalog.decode(self.tables[e].tobytes(), int(self.widths[e]), negated), int(self.gates[e]), self.S[:, begin:end], self.P[:, begin:end], int(1 - self.out_p[e] if negated else self.out_p[e]), int(self.out[e]), int(self.depth[e]))
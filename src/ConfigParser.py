@@ -41,7 +41,19 @@ class ConfigParser:
                 metrics = ConfigParser.search_subfield_in_config(configuration, "error", "metrics", True),
                 thresholds = ConfigParser.search_subfield_in_config(configuration, "error", "thresholds", True),
                 n_vectors = ConfigParser.search_subfield_in_config(configuration, "error", "vectors", False, 0),
-                dataset = ConfigParser.search_subfield_in_config(configuration, "error", "dataset", False, None))
+                dataset = ConfigParser.search_subfield_in_config(configuration, "error", "dataset", False, None),
+                early_stop = bool(ConfigParser.search_subfield_in_config(configuration, "error", "early_stop", False, False)),
+                chunk_size = int(ConfigParser.search_subfield_in_config(configuration, "error", "chunk_size", False, 4096)),
+                confidence = float(ConfigParser.search_subfield_in_config(configuration, "error", "confidence", False, 0.999)),
+                sensitivity = bool(ConfigParser.search_subfield_in_config(configuration, "error", "sensitivity", False, False)),
+                screening = ConfigParser.search_subfield_in_config(configuration, "error", "screening", False, None),
+                surrogate = bool(ConfigParser.search_subfield_in_config(configuration, "error", "surrogate", False, False)),
+                sampling = ConfigParser.search_subfield_in_config(configuration, "error", "sampling", False, "uniform"),
+                strata = int(ConfigParser.search_subfield_in_config(configuration, "error", "strata", False, 4)),
+                formal = bool(ConfigParser.search_subfield_in_config(configuration, "error", "formal", False, False)),
+                fidelity = ConfigParser.search_subfield_in_config(configuration, "error", "fidelity", False, None),
+                promotion = float(ConfigParser.search_subfield_in_config(configuration, "error", "promotion", False, 1.2)),
+                streaming = bool(ConfigParser.search_subfield_in_config(configuration, "error", "streaming", False, False)))
 
         self.weights = ConfigParser.search_subfield_in_config(configuration, "circuit", "io_weights", self.error_conf.builtin_metric and self.error_conf.metrics not in [ErrorConfig.Metric.EPROB])
         
@@ -57,8 +69,8 @@ class ConfigParser:
                 cooling_factor = float(ConfigParser.search_subfield_in_config(configuration, "amosa", "cooling_factor", True)),
                 annealing_iterations = int(ConfigParser.search_subfield_in_config(configuration, "amosa", "annealing_iterations", True)),
                 annealing_strength = int(ConfigParser.search_subfield_in_config(configuration, "amosa", "annealing_strength", True)),
-                hill_climb_checkpoint_file = f"{self.output_dir}/hill_climb_checkpoint.json",
-                minimize_checkpoint_file = f"{self.output_dir}/annealing_checkpoint.json",
+                hill_climb_checkpoint_file = f"{self.output_dir}/hill_climb_checkpoint.npz",
+                minimize_checkpoint_file = f"{self.output_dir}/annealing_checkpoint.npz",
                 cache_dir = f"{self.output_dir}/.cache")
         
         self.variable_grouping_strategy = ConfigParser.search_subfield_in_config(configuration, "amosa", "grouping", False, None)
@@ -0,0 +1,157 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import asyncio, json, os, threading, time, traceback, collections, numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+def to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+class Daemon:
+    """
+    Keeps designs (i.e., whatever create_session puts in a click-like context: Yosys helper, graph, catalog, problem
+    and its worker pool) warm in memory, and answers JSON-line requests over a UNIX socket. Each request is
+    {"id": ..., "op": ..., "conf": "config.json", "dataset": null, ...}; the reply is {"id": ..., "ok": true, "result": ...}
+    or {"id": ..., "ok": false, "error": ...}.
+    Clients are served concurrently; requests concerning the same design are serialized, and the work is carried out
+    by a thread pool. The least recently used idle designs are evicted when more than max_sessions are loaded.
+    """
+    def __init__(self, socket_path, create_session, handlers, max_sessions = 4, max_workers = 4):
+        self.socket_path = socket_path
+        self.create_session = create_session
+        self.handlers = handlers
+        self.max_sessions = max_sessions
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.sessions = collections.OrderedDict()
+        self.sessions_lock = threading.RLock()
+        self.stop = None
+
+    def serve(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        self.stop = asyncio.Event()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, path = self.socket_path, limit = 2**26)
+        print(f"Listening on {self.socket_path}")
+        async with server:
+            await self.stop.wait()
+        self.executor.shutdown()
+        for key in list(self.sessions.keys()):
+            self.evict(key)
+        os.remove(self.socket_path)
+
+    async def handle_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                reply = await self.dispatch(line)
+                writer.write((json.dumps(reply, default = to_json) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass # client went away, or the daemon is shutting down
+        finally:
+            writer.close()
+
+    async def dispatch(self, line):
+        request = {}
+        try:
+            request = json.loads(line)
+            op = request["op"]
+            if op == "status":
+                result = self.status()
+            elif op == "evict":
+                result = self.evict(self.session_key(request))
+            elif op == "shutdown":
+                self.stop.set()
+                result = "bye"
+            else:
+                assert op in self.handlers, f"Unknown op {op}. Supported: {['status', 'evict', 'shutdown'] + list(self.handlers.keys())}"
+                loop = asyncio.get_running_loop()
+                session = await loop.run_in_executor(self.executor, self.get_session, request)
+                result = await loop.run_in_executor(self.executor, self.run, session, self.handlers[op], request)
+            return {"id": request.get("id"), "ok": True, "result": result}
+        except Exception as e:
+            if not isinstance(e, AssertionError):
+                traceback.print_exc()
+            return {"id": request.get("id") if isinstance(request, dict) else None, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    @staticmethod
+    def session_key(request):
+        return os.path.abspath(request["conf"]), request.get("dataset")
+
+    def get_session(self, request):
+        key = self.session_key(request)
+        with self.sessions_lock:
+            if key in self.sessions and self.sessions[key].mtime != os.path.getmtime(key[0]):
+                print(f"{key[0]} changed, reloading")
+                self.evict(key)
+            if key not in self.sessions:
+                self.sessions[key] = SimpleNamespace(obj = None, lock = threading.Lock(), mtime = os.path.getmtime(key[0]), last_used = time.time(), users = 0)
+            self.sessions.move_to_end(key)
+            session = self.sessions[key]
+            session.users += 1
+        try:
+            with session.lock:
+                if session.obj is None:
+                    print(f"Loading {key[0]}")
+                    session.obj = self.create_session(*key)
+        except:
+            self.release(session)
+            raise
+        self.evict_idle()
+        return session
+
+    def release(self, session):
+        with self.sessions_lock:
+            session.users -= 1
+            session.last_used = time.time()
+
+    def run(self, session, handler, request):
+        try:
+            with session.lock:
+                return handler(session, request)
+        finally:
+            self.release(session)
+            self.evict_idle()
+
+    def evict_idle(self):
+        with self.sessions_lock:
+            for key in list(self.sessions.keys()):
+                if len(self.sessions) > self.max_sessions and self.sessions[key].users == 0:
+                    self.evict(key)
+
+    def evict(self, key):
+        with self.sessions_lock:
+            if key not in self.sessions or self.sessions[key].users > 0:
+                return False
+            session = self.sessions.pop(key)
+        if session.obj is None:
+            return False
+        print(f"Evicting {key[0]}")
+        if "problem" in session.obj and session.obj["problem"].workers is not None:
+            session.obj["problem"].workers.close()
+        return True
+
+    def status(self):
+        return [{"conf": k[0], "dataset": k[1], "loaded": s.obj is not None, "busy": s.users > 0, "idle": time.time() - s.last_used} for k, s in self.sessions.items()]
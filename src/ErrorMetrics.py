@@ -14,9 +14,50 @@ You should have received a copy of the GNU General Public License along with
 RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
 Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
-import numpy as np
+import numpy as np, os
 from .DynLoader import *
 from enum import Enum
+
+class CustomMetric:
+    """
+    User-defined error metric, i.e., a function from a plugin module (see metrics/relative_error_magnitude.py).
+    The function gets an OutputSet, i.e., exact and approximate outputs of the samples as numpy arrays, and the weights
+    of primary outputs, and it returns
+     - one error quantity per sample, as a numpy array, if reduction is "mean" or "max": the metric is the mean (or the
+       maximum) of such quantities, it is computed chunk by chunk, and it allows early stopping as builtin metrics do;
+     - the value of the metric, if reduction is "none".
+    """
+    reductions = ["mean", "max", "none"]
+
+    def __init__(self, module, function, reduction = "mean", nonnegative = False, label = None):
+        assert reduction in CustomMetric.reductions, f"Unsupported reduction {reduction}. Supported: {CustomMetric.reductions}"
+        self.module = os.path.splitext(module)[0]
+        self.function_name = function
+        self.reduction = reduction
+        self.nonnegative = nonnegative
+        self.name = label if label is not None else function
+        self.function = getattr(dynamic_import(self.module), function)
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != "function"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.function = getattr(dynamic_import(self.module), self.function_name)
+
+    def __repr__(self):
+        return f"{self.name} ({self.module}.{self.function_name}, {self.reduction})"
+
+    def quantities(self, outputs, weights):
+        return np.asarray(self.function(outputs, weights), dtype = float)
+
+    def __call__(self, outputs, weights):
+        if self.reduction == "none":
+            return float(self.function(outputs, weights))
+        quantities = self.quantities(outputs, weights)
+        return float(outputs.samples.mean(quantities) if self.reduction == "mean" else np.max(quantities))
+
+
 class ErrorConfig:
     
     class Metric(Enum):
@@ -33,20 +74,36 @@ class ErrorConfig:
         ME = 11             # Mean error
         MARE = 12           # Mean absolute relative error
         WSBEP = 13          # Weighted sum of bit-error probability
+
+    samplings = ["uniform", "stratified", "importance"]
         
-    def __init__(self, metrics, thresholds, n_vectors, dataset):
+    def __init__(self, metrics, thresholds, n_vectors, dataset, early_stop = False, chunk_size = 4096, confidence = 0.999, sensitivity = False, screening = None, surrogate = False, sampling = "uniform", strata = 4, formal = False, fidelity = None, promotion = 1.2, streaming = False):
         self.metrics = None
         self.thresholds = thresholds if isinstance(thresholds, (list, tuple)) else [thresholds]
         self.n_vectors = n_vectors 
         self.dataset = dataset
-        self.function = None
-        self.builtin_metric = None
-        if isinstance(metrics, (list, tuple, str)):
-            self.builtin_metric = True
-            self.get_builin_metric(metrics)
-        elif isinstance(metrics, dict):
-           self.get_custom_metric(metrics)
+        self.early_stop = early_stop
+        self.chunk_size = chunk_size
+        self.confidence = confidence
+        self.sensitivity = sensitivity
+        self.screening = screening
+        self.surrogate = surrogate
+        self.sampling = sampling
+        self.strata = strata
+        self.formal = formal
+        self.fidelity = fidelity
+        self.promotion = promotion
+        self.streaming = streaming
+        self.get_builin_metric(metrics)
+        self.builtin_metric = not any(isinstance(m, CustomMetric) for m in self.metrics)
         assert len(self.metrics) == len(self.thresholds), "Please, specify as much thresholds as error metrics you want to use!"
+        assert not self.early_stop or all(m.reduction != "none" for m in self.metrics if isinstance(m, CustomMetric)), "Early stop requires custom metrics to be reduced by mean or max"
+        assert self.sampling in ErrorConfig.samplings, f"Unsupported sampling {self.sampling}. Supported: {ErrorConfig.samplings}"
+        assert not self.early_stop or self.sampling == "uniform" or ErrorConfig.Metric.VARED not in self.metrics, "Early stop does not support VARED with non-uniform sampling"
+        assert not self.streaming or all(m.reduction != "none" for m in self.metrics if isinstance(m, CustomMetric)), "Streaming evaluation requires custom metrics to be reduced by mean or max"
+        assert not self.streaming or self.sampling == "uniform" or ErrorConfig.Metric.VARED not in self.metrics, "Streaming evaluation does not support VARED with non-uniform sampling"
+        assert self.fidelity is None or self.fidelity > 0, "The low-fidelity subset must hold some samples"
+        assert self.promotion >= 1, "The promotion factor must not be lower than 1"
     
     @staticmethod       
     def get_builtin_metrics():
@@ -68,18 +125,17 @@ class ErrorConfig:
 
     def get_builin_metric(self, metrics):
         error_metrics = ErrorConfig.get_builtin_metrics()
-        if isinstance(metrics, str):
-            self.metrics = [error_metrics[metrics]]
-        elif isinstance(metrics, (list, tuple)):
-            self.metrics = [ error_metrics[m] for m in metrics ]
+        if isinstance(metrics, (str, dict)):
+            metrics = [metrics]
+        self.metrics = [ self.get_custom_metric(m) if isinstance(m, dict) else error_metrics[m] for m in metrics ]
 
-    def get_custom_metric(self, metric):
+    @staticmethod
+    def get_custom_metric(metric):
         if "module" not in metric.keys():
             raise ValueError("'module' field not specified")
         if "function" not in metric.keys():
             raise ValueError("'function' field not specified")
-        self.function = dynamic_import(metric["module"])
-        self.builtin_metric = False
+        return CustomMetric(metric["module"], metric["function"], metric.get("reduction", "mean"), bool(metric.get("nonnegative", False)), metric.get("label", None))
 
 def bool_to_value(signal, weights):
     return np.sum([float(weights[o]) * signal[o] for o in signal.keys()])
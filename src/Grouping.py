@@ -0,0 +1,82 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import os, pyamosa, numpy as np
+from tqdm import tqdm
+from .Archive import *
+
+class ParallelDifferentialVariableGrouping2(pyamosa.DifferentialVariableGrouping2):
+    """
+    DG2 differential grouping, whose interaction probes are simulated in batches, by MOP.evaluate_batch(), rather than
+    one at a time. Probes that are already in the cache of the problem, or that are the same configuration, are not
+    simulated again. Probe results are checkpointed to checkpoint_file after each batch, so that an interrupted grouping
+    resumes where it stopped, and groupings with different transfer strategies reuse them.
+    """
+    def __init__(self, problem, checkpoint_file = None, batch_size = None):
+        super().__init__(problem)
+        self.checkpoint_file = checkpoint_file
+        self.batch_size = batch_size if batch_size is not None else 16 * problem.workers.ncpus
+        self.writer = AsyncWriter()
+
+    def batches(self, items):
+        return [items[k:k + self.batch_size] for k in range(0, len(items), self.batch_size)]
+
+    def point(self, values):
+        x = list(self.x_1["x"])
+        for i, v in values.items():
+            x[i] = v
+        return x
+
+    def probe(self, xs):
+        keys = [self.problem.get_cache_key({"x": x}) for x in xs]
+        missing = {k: x for k, x in zip(keys, xs) if k not in self.problem.cache}
+        if missing:
+            self.problem.evaluate_batch(list(missing.values()))
+        return [self.problem.cache[k]["f"] for k in keys]
+
+    def save_checkpoint(self):
+        if self.checkpoint_file is not None:
+            self.writer.submit(self.checkpoint_file, {"m": np.array(self.m), "f_1": np.array(self.x_1["f"], dtype = float), "f": self.f.copy(), "F": self.F.copy()})
+
+    def read_checkpoint(self):
+        if self.checkpoint_file is None or not os.path.exists(self.checkpoint_file):
+            return
+        with np.load(self.checkpoint_file) as checkpoint:
+            if checkpoint["m"].tolist() == self.m and np.array_equal(checkpoint["f_1"], np.array(self.x_1["f"], dtype = float)) and checkpoint["F"].shape == self.F.shape:
+                print(f"Recovering interaction probes from {self.checkpoint_file}")
+                self.f, self.F = checkpoint["f"], checkpoint["F"]
+
+    def compute_ism(self):
+        n = self.problem.num_of_variables
+        self.read_checkpoint()
+        singles = [i for i in range(n) if np.all(np.isnan(self.f[i]))]
+        pairs = [(i, j) for i in range(n) for j in range(i + 1, n) if np.all(np.isnan(self.F[i][j]))]
+        with tqdm(total = len(singles) + len(pairs), desc = "Probing interactions...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}") as pbar:
+            for batch in self.batches(singles):
+                for i, f in zip(batch, self.probe([self.point({i: self.m[i]}) for i in batch])):
+                    self.f[i] = f
+                self.save_checkpoint()
+                pbar.update(len(batch))
+            for batch in self.batches(pairs):
+                for (i, j), f in zip(batch, self.probe([self.point({i: self.m[i], j: self.m[j]}) for i, j in batch])):
+                    self.F[i][j] = f
+                self.save_checkpoint()
+                pbar.update(len(batch))
+        self.writer.flush()
+        upper = np.triu(np.ones((n, n), dtype = bool), 1)
+        delta_1 = self.f[:, None, :] - np.array(self.x_1["f"], dtype = float)
+        delta_2 = self.F - self.f[None, :, :]
+        self.Lambda = np.where(upper[:, :, None], np.absolute(delta_1 - delta_2), 0)
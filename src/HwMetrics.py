@@ -16,6 +16,7 @@ Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
 
 from .lut_pwr import *
+from pyalslib import ALSGraph
 from enum import Enum
 
 class HwConfig:
@@ -51,3 +52,74 @@ def get_depth(configuration, lut_io_info, graph):
 
 def get_switching(configuration, lut_io_info, graph):
     return np.sum([internal_node_activity(v["spec"], np.array(np.array(v["freq"], dtype=float) / np.sum(v["freq"])).tolist())[0] for v in lut_io_info.values()])
+
+
+class HwEngine:
+    """
+    Incremental computation of hardware metrics, from one configuration to the next one. Configurations are given as
+    decision vectors, whose elements are the catalog distances of the cells, and only cells whose distance changed
+    since the previous call are visited: gates are updated by their difference, and the depth of each node (its own
+    depth plus the deepest of its predecessors, as in ALSGraph.get_depth()) is recomputed only for changed cells and
+    their successors. Gates and depth of each cell at each distance are read from the catalog once, and again when it
+    grows. The switching activity of a LUT is recomputed only if its specification or its input-pattern frequencies
+    changed.
+    """
+    def __init__(self, graph):
+        vertices = graph.get_po()[0].graph.vs
+        cells = [v for v in vertices if v["type"] == ALSGraph.VertexType.CELL]
+        self.cells = [v.index for v in cells]
+        self.specs = [v["spec"] for v in cells]
+        self.nodes = [v.index for v in vertices if v["type"] in (ALSGraph.VertexType.CELL, ALSGraph.VertexType.PRIMARY_OUTPUT)]
+        self.predecessors = {v: [p.index for p in vertices[v].predecessors()] for v in self.nodes}
+        self.successors = {v: [s.index for s in vertices[v].successors() if s.index in self.predecessors] for v in self.nodes}
+        self.cell_depth = np.zeros(len(vertices), dtype = int)
+        self.node_depth = np.zeros(len(vertices), dtype = int)
+        self.catalog = None
+        self.lut_gates = []
+        self.lut_depth = []
+        self.x = None
+        self.gates = 0
+        self.activities = {}
+
+    def tables(self, catalog):
+        # entries are only ever appended to a catalog (see CompactCatalog.extend()), so totals stay valid when it grows
+        if catalog is not self.catalog:
+            self.catalog = catalog
+            self.lut_gates, self.lut_depth = [], []
+            for spec in self.specs:
+                l, _ = catalog.index[spec]
+                self.lut_gates.append(catalog.gates[catalog.offsets[l]:catalog.offsets[l + 1]].tolist())
+                self.lut_depth.append(catalog.depth[catalog.offsets[l]:catalog.offsets[l + 1]].tolist())
+
+    def update(self, x, catalog):
+        self.tables(catalog)
+        x = np.asarray(x, dtype = int)
+        changed = range(len(x)) if self.x is None else np.flatnonzero(x != self.x)
+        affected = set()
+        for i in changed:
+            v = self.cells[i]
+            self.gates += self.lut_gates[i][x[i]] - (0 if self.x is None else self.lut_gates[i][self.x[i]])
+            self.cell_depth[v] = self.lut_depth[i][x[i]]
+            affected.add(v)
+            affected.update(self.successors[v])
+        for v in affected:
+            self.node_depth[v] = max(self.cell_depth[p] for p in self.predecessors[v]) + self.cell_depth[v]
+        self.x = x
+
+    def get_gates(self, x, catalog, lut_io_info):
+        self.update(x, catalog)
+        return self.gates
+
+    def get_depth(self, x, catalog, lut_io_info):
+        self.update(x, catalog)
+        return int(self.node_depth.max())
+
+    def get_switching(self, x, catalog, lut_io_info):
+        activities = []
+        for name, v in lut_io_info.items():
+            key = (v["spec"], np.asarray(v["freq"]).tobytes())
+            if name not in self.activities or self.activities[name][0] != key:
+                self.activities[name] = (key, internal_node_activity(v["spec"], np.array(np.array(v["freq"], dtype=float) / np.sum(v["freq"])).tolist())[0])
+            activities.append(self.activities[name][1])
+        return np.sum(activities)
+
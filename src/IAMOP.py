@@ -14,12 +14,9 @@ You should have received a copy of the GNU General Public License along with
 RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
 Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
-import itertools, pyamosa, numpy as np, copy, json5, pandas as pd
-from pyalslib import list_partitioning, negate, flatten
-from multiprocessing import cpu_count, Pool
-from .HwMetrics import *
-from .ErrorMetrics import *
-from tqdm import tqdm
+import json5, pandas as pd
+from .SampleSet import *
+from .Simulator import *
 from .MOP import MOP
 
 class IAMOP(MOP):
@@ -40,34 +37,32 @@ class IAMOP(MOP):
             return self.load_dataset_spreasheet()
     
     def load_dataset_json(self):
-        self.samples = json5.load(open(self.dataset))
-        PIs = set(pi["name"] for pi in self.graph.get_pi())
-        lut_io_info = {}
-        self.error_config.n_vectors = len(self.samples)
+        # samples are parsed as a whole, as dictionaries
+        assert not self.error_config.streaming, "Streaming evaluation requires csv or excel datasets, since Json ones are parsed as a whole"
+        samples = json5.load(open(self.dataset))
+        pi_names = [pi["name"] for pi in self.graph.get_pi()]
+        po_names = [po["name"] for po in self.graph.get_po()]
+        self.error_config.n_vectors = len(samples)
         print(f"Read {self.error_config.n_vectors} test vectors.")
-        for sample in tqdm(self.samples, desc = "Checking input-vectors...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}"):
-            assert PIs == set(sample["input"].keys())
-            output, lut_io_info = self.graph.evaluate(sample["input"], lut_io_info)
-            assert sample["output"] == output, f"\n\nRead output:\n{sample['output']}\n\nComputed output:\n{output}\n"
+        assert all(set(pi_names) == set(sample["input"].keys()) for sample in samples)
+        self.samples = SampleSet.from_dicts(samples, pi_names, po_names)
+        print("Checking input-vectors...")
+        outputs, lut_io_info = self.simulate_exact(self.samples)
+        self.check_simulator(self.samples, outputs)
+        mismatches = np.flatnonzero(np.any(outputs != self.samples.outputs, axis = 1))
+        assert len(mismatches) == 0, f"\n\nRead output:\n{self.samples[int(mismatches[0])]['output']}\n\nComputed output:\n{self.samples.output_dict(outputs[mismatches[0]])}\n"
         return lut_io_info
     
     def load_dataset_spreasheet(self):
-        dataframe = pd.read_csv(self.dataset, sep = ';') if self.dataset.endswith(".csv") else pd.read_excel(self.dataset)
-        column_names = dataframe.columns.values.tolist()
-        PIs = set(pi["name"] for pi in self.graph.get_pi())
-        assert all(c in PIs for c in column_names), f"Columns mismatches! Expected: {PIs}, got {column_names}"
-        lut_io_info = {}
-        self.error_config.n_vectors = len(dataframe)
+        # csv files are read chunk by chunk, and each chunk is bit-packed right away
+        dataframes = pd.read_csv(self.dataset, sep = ';', chunksize = self.error_config.chunk_size) if self.dataset.endswith(".csv") else [pd.read_excel(self.dataset)]
+        pi_names = [pi["name"] for pi in self.graph.get_pi()]
+        inputs = []
+        for dataframe in dataframes:
+            column_names = dataframe.columns.values.tolist()
+            assert all(c in pi_names for c in column_names), f"Columns mismatches! Expected: {pi_names}, got {column_names}"
+            inputs.append(pack(dataframe[pi_names].to_numpy() != 0))
+        self.samples = SampleSet(pi_names, [po["name"] for po in self.graph.get_po()], np.concatenate(inputs))
+        self.error_config.n_vectors = len(self.samples)
         print(f"Read {self.error_config.n_vectors} test vectors.")
-        samples = dataframe.to_dict(orient='records')
-        self.samples = []
-        for sample in tqdm(samples, desc = "Checking input-vectors...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}"):
-            output, lut_io_info = self.graph.evaluate(sample, lut_io_info)
-            self.samples.append({"input": sample, "output": output})
-        return lut_io_info
-
-        
-        
-        
-
-    
\ No newline at end of file
+        return self.compute_reference_outputs()
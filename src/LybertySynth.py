@@ -14,10 +14,12 @@ You should have received a copy of the GNU General Public License along with
 RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
 Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
+import re, numpy as np
 from pyosys import libyosys as ys
 from liberty.parser import parse_liberty
 
 class LibertySynth:
+    units = {"": 1, "m": 1e-3, "u": 1e-6, "n": 1e-9, "p": 1e-12, "f": 1e-15}
 
     def __init__(self, liberty_file_name):
         self.liberty = liberty_file_name
@@ -25,6 +27,28 @@ class LibertySynth:
             library = parse_liberty(f.read())
         self.cell_area = { cell_group.args[0] : float(cell_group['area']) for cell_group in library.get_groups('cell') }
         self.cell_power = { cell_group.args[0] : float(cell_group['cell_leakage_power'] if cell_group['cell_leakage_power'] is not None else cell_group['drive_strength'] ) for cell_group in library.get_groups('cell') } 
+        # data for vector-based power estimation, in SI units: V, F, W, and J per output toggle
+        self.voltage = float(library['nom_voltage']) if library['nom_voltage'] is not None else 1.0
+        capacitive_load_unit = library.get_attributes('capacitive_load_unit')
+        self.capacitance_unit = float(capacitive_load_unit[0][0]) * LibertySynth.units[str(capacitive_load_unit[0][1])[0].lower()] if capacitive_load_unit else 1e-12
+        self.leakage_unit = LibertySynth.parse_unit(library['leakage_power_unit'], 1e-9)
+        self.cell_leakage = { cell_group.args[0] : float(cell_group['cell_leakage_power'] or 0) * self.leakage_unit for cell_group in library.get_groups('cell') }
+        self.cell_inputs = { cell_group.args[0] : { pin.args[0] : float(pin['capacitance'] or 0) * self.capacitance_unit for pin in cell_group.get_groups('pin') if pin['direction'] == "input" } for cell_group in library.get_groups('cell') }
+        self.cell_outputs = { cell_group.args[0] : { pin.args[0] : pin['function'].value for pin in cell_group.get_groups('pin') if pin['direction'] == "output" and pin['function'] is not None } for cell_group in library.get_groups('cell') }
+        # internal energy tables are in capacitive_load_unit * voltage_unit^2; their average is taken for each output pin
+        self.cell_energy = { cell_group.args[0] : { pin.args[0] : LibertySynth.mean_energy(pin) * self.capacitance_unit for pin in cell_group.get_groups('pin') if pin['direction'] == "output" } for cell_group in library.get_groups('cell') }
+
+    @staticmethod
+    def parse_unit(value, default):
+        if value is None:
+            return default
+        number, prefix = re.match(r"\s*([0-9.eE+-]+)\s*([munpf]?)", str(value).strip('"')).groups()
+        return float(number) * LibertySynth.units[prefix]
+
+    @staticmethod
+    def mean_energy(pin):
+        tables = [table.get_array('values') for group in pin.get_groups('internal_power') for table in group.get_groups('rise_power') + group.get_groups('fall_power')]
+        return float(np.mean([np.mean(t) for t in tables])) if tables else 0.0
 
     def get_area(self, design):
         return sum([self.cell_area[cell.type.str()[1:]] for module in design.selected_whole_modules_warn() for cell in module.selected_cells()])
@@ -32,7 +56,13 @@ class LibertySynth:
     def get_power(self, design):
         return sum([self.cell_power[cell.type.str()[1:]] for module in design.selected_whole_modules_warn() for cell in module.selected_cells()])
 
-    def do_synth(self, hdl_source, top_module):
+    def do_synth(self, hdl_source, top_module, json_netlist = None):
+        """
+        Synthesizes hdl_source on the Liberty cells, and returns its area and power. If json_netlist is given, the mapped
+        netlist is written to it, in the Yosys Json format.
+        """
         design = ys.Design()
         ys.run_pass(f"tee -q read_verilog {hdl_source}; tee -q synth -flatten -top {top_module}; tee -q clean -purge; tee -q read_liberty -lib {self.liberty}; tee -q abc -liberty {self.liberty };", design)
+        if json_netlist is not None:
+            ys.run_pass(f"tee -q opt_clean -purge; tee -q write_json {json_netlist};", design)
         return self.get_area(design), self.get_power(design) /10000
\ No newline at end of file
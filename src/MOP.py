@@ -14,13 +14,47 @@ You should have received a copy of the GNU General Public License along with
 RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
 Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
-import itertools, pyamosa, numpy as np, copy, random, json
-from pyalslib import list_partitioning, negate, flatten
-from multiprocessing import cpu_count, Pool
+import pyamosa, numpy as np, json, os, copy, time, collections.abc
+from pyalslib import negate
+from multiprocessing import cpu_count
 from .HwMetrics import *
 from .ErrorMetrics import *
+from .SampleSet import *
+from .SharedData import *
+from .Accumulators import *
+from .Simulator import *
+from .Surrogate import Surrogate
+from .WorstCaseError import WorstCaseError
+from pyamosa.MultiFileCacheHandle import MultiFileCacheHandle
+from scipy.stats import norm
 from tqdm import tqdm
 
+class SharedCache(collections.abc.MutableMapping):
+    """
+    Cache of the MOPs created by MOP.derive(): objectives are stored once per combination of error metrics, in a dict
+    shared by all the derived MOPs, while constraints are computed from the thresholds of each MOP.
+    """
+    def __init__(self, store, thresholds):
+        self.store = store
+        self.thresholds = thresholds
+
+    def __getitem__(self, key):
+        f = self.store[key]
+        return {"f": f, "g": [e - t for e, t in zip(f, self.thresholds)]}
+
+    def __setitem__(self, key, value):
+        self.store[key] = value["f"]
+
+    def __delitem__(self, key):
+        del self.store[key]
+
+    def __iter__(self):
+        # derived MOPs may be optimized concurrently: iterate over a snapshot of the keys
+        return iter(list(self.store))
+
+    def __len__(self):
+        return len(self.store)
+
 class MOP(pyamosa.Problem):
     error_ffs = {
         ErrorConfig.Metric.EPROB : "get_ep",
@@ -53,10 +87,27 @@ class MOP(pyamosa.Problem):
             ErrorConfig.Metric.WSBEP: "WSBEP"
         }
     
+    # per-sample error quantity and accumulator used to compute each metric in chunks, see get_errors_early_stop()
+    error_accumulators = {
+        ErrorConfig.Metric.EPROB : ("evaluate_error_mask",      MeanAccumulator,     True),
+        ErrorConfig.Metric.AWCE  : ("evaluate_abs_ed",          MaxAccumulator,      None),
+        ErrorConfig.Metric.MAE   : ("evaluate_abs_ed",          MeanAccumulator,     True),
+        ErrorConfig.Metric.WRE   : ("evaluate_relative_ed",     MaxAccumulator,      None),
+        ErrorConfig.Metric.MRE   : ("evaluate_relative_ed",     MeanAccumulator,     False),
+        ErrorConfig.Metric.MARE  : ("evaluate_abs_relative_ed", MeanAccumulator,     True),
+        ErrorConfig.Metric.MSE   : ("evaluate_squared_ed",      MeanAccumulator,     True),
+        ErrorConfig.Metric.MED   : ("evaluate_rounded_abs_ed",  MeanAccumulator,     True),
+        ErrorConfig.Metric.ME    : ("evaluate_rounded_signed_ed", MeanAccumulator,   False),
+        ErrorConfig.Metric.MRED  : ("evaluate_rounded_relative_ed", MeanAccumulator, False),
+        ErrorConfig.Metric.RMSED : ("evaluate_squared_ed",      MeanAccumulator,     True),
+        ErrorConfig.Metric.VARED : ("evaluate_signed_ed",       VarianceAccumulator, False),
+        ErrorConfig.Metric.WSBEP : ("evaluate_weighted_bit_errors", MeanAccumulator, None)
+    }
+    
     hw_ffs = {
-        HwConfig.Metric.GATES:      get_gates,
-        HwConfig.Metric.DEPTH:      get_depth,
-        HwConfig.Metric.SWITCHING:  get_switching
+        HwConfig.Metric.GATES:      "get_gates",
+        HwConfig.Metric.DEPTH:      "get_depth",
+        HwConfig.Metric.SWITCHING:  "get_switching"
     }
     
     hw_labels = {
@@ -70,21 +121,50 @@ class MOP(pyamosa.Problem):
         self.graph = graph
         self.output_weights = output_weights
         self.catalog = catalog
+        self.compact = catalog if isinstance(catalog, CompactCatalog) else CompactCatalog(catalog)
         self.error_config = error_config
         self.hw_config = hw_config
         self.ncpus = min(ncpus, cpu_count())
-        self.graphs = [copy.deepcopy(graph) for _ in range(self.ncpus)]
+        self.workers = None
+        self.shared_catalog = None
+        self.serial = False
+        self.n_shards = None
+        self.batch_mode = "candidates"
+        self.early_stops = 0
+        self.simulated_samples = 0
+        self.sensitivity = None
+        self.screened = 0
+        self.surrogate = Surrogate(self.error_config.thresholds) if self.error_config.surrogate else None
+        self.estimated = set()
+        self.fidelity_size = None
+        self.low_fidelity = 0
+        self.promoted = 0
+        self.front = []
+        self.evaluations = {}
+        self.hw_engine = HwEngine(self.graph)
         self.n_vars = self.graph.get_num_cells()
         self.upper_bound = self.get_upper_bound()
+        self.catalog_version = getattr(self.catalog, "version", None)
         self.samples = None
+        self.worst_case = WorstCaseError(self.graph, self.output_weights) if self.error_config.formal else None
         pyamosa.Problem.__init__(self, self.n_vars, [pyamosa.Type.INTEGER] * self.n_vars, [0] * self.n_vars, self.upper_bound, len(self.error_config.metrics) + len(self.hw_config.metrics), len(self.error_config.metrics))
         
     def init(self):
         lut_io_info = self.generate_samples()
         self._setup_mop(lut_io_info)
         
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != "workers"} | {"workers": None}
+
     def _setup_mop(self, lut_io_info):
-        self._args = [[g, s, [0] * self.n_vars] for g, s in zip(self.graphs, list_partitioning(self.samples, self.ncpus))] if self.error_config.builtin_metric else None
+        if self.error_config.early_stop or self.error_config.fidelity is not None:
+            # partial error estimates are meaningful only if each chunk is a random sample
+            self.samples = self.samples.permute()
+        if self.error_config.fidelity is not None and (size := self.get_fidelity_size()) < len(self.samples):
+            self.fidelity_size = size
+            self.samples = self.representative_prefix(self.samples, size)
+        self.share_with_workers()
+        self.reference_lut_io_info = lut_io_info
         self.baseline_and_gates = self.get_baseline_gates(None)
         self.baseline_depth = self.get_baseline_depth(None)
         self.baseline_switching = self.get_baseline_switching(lut_io_info)
@@ -96,129 +176,646 @@ class MOP(pyamosa.Problem):
             print(f"\t - {m}")
         print(f"#vars: {self.n_vars}, ub:{self.upper_bound}, #conf.s {np.prod([ float(x + 1) for x in self.upper_bound ])}.")
         print(f"Baseline requirements. Nodes: {self.baseline_and_gates}. Depth: {self.baseline_depth}. Switching: {self.baseline_switching}")
+        if self.fidelity_size is not None:
+            print(f"Multi-fidelity evaluation: candidates are scored on {self.fidelity_size} out of {len(self.samples)} samples first")
+
+    def widen(self):
+        # catalogs synthesized in background (see StreamingCatalog) keep growing: the search space grows with them
+        version = getattr(self.catalog, "version", self.catalog_version)
+        if version != self.catalog_version and self.sensitivity is None:
+            self.catalog_version = version
+            self.upper_bound[:] = self.get_upper_bound()
+        self.share_catalog()
+
+    def wait_for_catalog(self):
+        if hasattr(self.catalog, "wait"):
+            print("Waiting for the catalog to be completed...")
+            self.catalog.wait()
+            self.widen()
 
     def evaluate(self, x, out):
+        self.widen()
+        configuration = self.matter_configuration(x)
+        if (errors := self.screen(x)) is not None or (self.surrogate is not None and (errors := self.surrogate.screen(x)) is not None):
+            # estimated, not simulated: such candidates are kept out of the persistent cache
+            self.estimated.add(self.get_cache_key({"x": x}))
+            lut_io_info = self.estimate_lut_io_info(configuration)
+        elif self.fidelity_size is not None and not self.promote(x, low := self.get_low_fidelity_errors(configuration)):
+            # low-fidelity objectives: as estimated ones, they are kept out of the persistent cache
+            self.estimated.add(self.get_cache_key({"x": x}))
+            _, errors, lut_io_info = low
+        else:
+            self.estimated.discard(self.get_cache_key({"x": x}))
+            if self.error_config.early_stop:
+                errors, lut_io_info, stopped = self.get_errors_early_stop(configuration)
+                if stopped:
+                    # estimates on part of the samples only hold against the thresholds that stopped the simulation, so
+                    # they are kept out of the persistent cache, as well as of the one shared by derived MOPs
+                    self.estimated.add(self.get_cache_key({"x": x}))
+            elif self.fidelity_size is not None and self.error_config.streaming:
+                # samples of the subset are not simulated again: their accumulators are merged with the streamed ones
+                subset = MOP.partial_accumulators(self.error_config.metrics)
+                MOP.accumulate(subset, self.error_config.metrics, low[0], self.output_weights)
+                errors, lut_io_info = self.get_errors_streaming(configuration, self.error_config.metrics, self.fidelity_size, [(subset, low[2])])
+            elif self.fidelity_size is not None:
+                # samples of the subset are not simulated again
+                high = self.get_outputs(configuration, self.fidelity_size)
+                outputs, lut_io_info = OutputSet.concatenate(self.samples, [low[0].approx, high[0].approx]), MOP.merge_lut_io_info([low[2], high[1]])
+                errors = [self.get_error(m, outputs) for m in self.error_config.metrics]
+            else:
+                errors, lut_io_info = self.get_errors(configuration)
+            errors = self.prove_errors(configuration, self.error_config.metrics, errors)
+            if self.surrogate is not None and self.get_cache_key({"x": x}) not in self.estimated:
+                # partial estimates of early-stopped candidates would bias the model
+                self.surrogate.add(x, errors)
+        self.fill_objectives(out, x, errors, lut_io_info)
+        if self.fidelity_size is not None and self.get_cache_key({"x": x}) not in self.estimated:
+            self.add_to_front(out)
+
+    def get_errors(self, configuration):
+        # errors on the whole sample set
+        if self.error_config.streaming:
+            return self.get_errors_streaming(configuration, self.error_config.metrics)
+        outputs, lut_io_info = self.get_outputs(configuration)
+        return [self.get_error(m, outputs) for m in self.error_config.metrics], lut_io_info
+
+    def get_error(self, metric, outputs):
+        return metric(outputs, self.output_weights) if isinstance(metric, CustomMetric) else getattr(self, self.error_ffs[metric])(outputs, self.output_weights)
+
+    def prove_errors(self, configuration, metrics, errors):
+        # worst-case errors on samples are lower bounds, which the formal computation starts from
+        if self.worst_case is None:
+            return errors
+        return [self.worst_case.awce(configuration, e) if m == ErrorConfig.Metric.AWCE else self.worst_case.wre(configuration) if m == ErrorConfig.Metric.WRE else e for m, e in zip(metrics, errors)]
+
+    def get_error_quantities(self, metric, outputs):
+        return MOP.error_quantities(metric, outputs, self.output_weights)
+
+    @staticmethod
+    def error_quantities(metric, outputs, weights):
+        return metric.quantities(outputs, weights) if isinstance(metric, CustomMetric) else getattr(MOP, MOP.error_accumulators[metric][0])(outputs, weights)
+
+    def error_label(self, metric):
+        return metric.name if isinstance(metric, CustomMetric) else self.error_labels[metric]
+
+    def ffs_labels(self):
+        # labels of the values returned by evaluate_ffs()
+        builtin = list(self.error_labels.values()) if self.output_weights is not None else [self.error_labels[ErrorConfig.Metric.EPROB]]
+        return builtin + [m.name for m in self.error_config.metrics if isinstance(m, CustomMetric)] + list(self.hw_labels.values())
+
+    def add_to_cache(self, s):
+        if self.get_cache_key(s) not in self.estimated:
+            pyamosa.Problem.add_to_cache(self, s)
+
+    def load_cache(self, directory):
+        if isinstance(self.cache, SharedCache):
+            self.cache.update(MultiFileCacheHandle(directory).read())
+        else:
+            pyamosa.Problem.load_cache(self, directory)
+
+    def derive(self, error_config):
+        """
+        Returns a MOP sharing graph, catalog, samples, worker pool and evaluations with this one, but optimizing the error
+        metrics and thresholds of error_config. MOPs derived for the same error metrics share the objectives of every
+        configuration evaluated by any of them.
+        """
+        mop = copy.copy(self)
+        mop.workers = self.workers
+        mop.error_config = error_config
+        mop.num_of_objectives = len(error_config.metrics) + len(self.hw_config.metrics)
+        mop.num_of_constraints = len(error_config.metrics)
+        mop.cache = SharedCache(self.evaluations.setdefault(tuple(repr(m) for m in error_config.metrics), {}), error_config.thresholds)
+        mop.total_calls = mop.cache_hits = mop.early_stops = mop.simulated_samples = mop.screened = mop.low_fidelity = mop.promoted = 0
+        mop.front = []
+        mop.estimated = set()
+        mop.sensitivity = None
+        mop.upper_bound = self.get_upper_bound()
+        mop.surrogate = Surrogate(error_config.thresholds) if error_config.surrogate else None
+        mop.hw_engine = HwEngine(self.graph)
+        return mop
+
+    def reevaluate_archive(self, archive):
+        """
+        Re-evaluates archive members on all the samples, so that no estimated objective (see screen(), Surrogate,
+        promote() and get_errors_early_stop()) survives in the final archive, then
+        drops unfeasible and dominated members.
+        """
+        for s, out in zip(archive.candidate_solutions, self.evaluate_batch([s["x"] for s in archive.candidate_solutions], "Verifying the archive...")):
+            s["f"] = out["f"]
+            s["g"] = out["g"]
+        archive.remove_infeasible(self)
+        archive.remove_dominated()
+
+    def get_fidelity_size(self):
+        # the low-fidelity subset holds either the given number, or the given fraction, of the samples
+        fidelity = self.error_config.fidelity
+        return min(len(self.samples), int(fidelity) if fidelity >= 1 else int(np.ceil(fidelity * len(self.samples))))
+
+    def representative_prefix(self, samples, size):
+        """
+        Reorders samples so that the first size ones are a systematic sample over the exact output value, i.e., they
+        span its whole range in proportion, while the other ones keep their order.
+        """
+        if self.output_weights is None:
+            return samples
+        order = np.argsort(samples.output_values(self.output_weights), kind = "stable")
+        step = len(samples) / size
+        prefix = order[(np.random.uniform(0, step) + step * np.arange(size)).astype(int)]
+        order = np.concatenate([np.random.permutation(prefix), np.setdiff1d(np.arange(len(samples)), prefix)])
+        return SampleSet(samples.pi_names, samples.po_names, *[None if a is None else a[order] for a in (samples.inputs, samples.outputs, samples.weights, samples.strata)])
+
+    def get_low_fidelity_errors(self, configuration):
+        outputs, lut_io_info = self.get_outputs(configuration, 0, self.fidelity_size)
+        return outputs, [self.get_error(m, outputs) for m in self.error_config.metrics], lut_io_info
+
+    @staticmethod
+    def dominates(a, b):
+        return all(x <= y for x, y in zip(a, b)) and any(x < y for x, y in zip(a, b))
+
+    def promote(self, x, low):
+        """
+        Tells whether a candidate, given its errors on the low-fidelity subset, is worth the full-fidelity evaluation,
+        i.e., whether it may be non-dominated: its errors are within the thresholds, up to the promotion factor, and no
+        feasible full-fidelity candidate dominates it even if its errors were lowered by the same margin.
+        """
+        self.low_fidelity += 1
+        out = {}
+        self.fill_objectives(out, x, low[1], low[2])
+        margins = [(self.error_config.promotion - 1) * abs(t) for t in self.error_config.thresholds]
+        if any(g > m for g, m in zip(out["g"], margins)):
+            return False
+        relaxed = [f - m for f, m in zip(out["f"], margins)] + out["f"][len(margins):]
+        if any(MOP.dominates(f, relaxed) for f in self.front):
+            return False
+        self.promoted += 1
+        return True
+
+    def add_to_front(self, out):
+        # feasible full-fidelity candidates, against which low-fidelity ones are compared
+        if all(g <= 0 for g in out["g"]) and not any(MOP.dominates(f, out["f"]) or f == out["f"] for f in self.front):
+            self.front = [f for f in self.front if not MOP.dominates(out["f"], f)] + [list(out["f"])]
+
+    def fidelity_report(self):
+        rate = self.promoted / self.low_fidelity if self.low_fidelity else 0
+        return f"Multi-fidelity evaluation: {self.low_fidelity} candidates scored on {self.fidelity_size} out of {len(self.samples)} samples, {self.promoted} ({100 * rate:.1f}%) promoted to full-fidelity evaluation. {len(self.front)} full-fidelity non-dominated solutions."
+
+    def fill_objectives(self, out, x, errors, lut_io_info):
         out["f"] = []
         out["g"] = []
-        configuration = self.matter_configuration(x)
-        
-        outputs, lut_io_info = self.get_outputs(configuration)    
-        for m, t in zip(self.error_config.metrics, self.error_config.thresholds):
-            out["f"].append(getattr(self, self.error_ffs[m])(outputs, self.output_weights))
+        for e, t in zip(errors, self.error_config.thresholds):
+            out["f"].append(e)
             out["g"].append(out["f"][-1] - t)
         for metric in self.hw_config.metrics:
-            out["f"].append(self.hw_ffs[metric](configuration, lut_io_info, self.graph))
+            out["f"].append(getattr(self.hw_engine, self.hw_ffs[metric])(x, self.compact_catalog(), lut_io_info))
+
+    def evaluate_batch(self, xs, desc = None):
+        """
+        Evaluates several configurations at once, each worker simulating a whole configuration on all the samples.
+        Results are added to the cache.
+        """
+        self.widen()
+        configurations = [self.matter_configuration(x) for x in xs]
+        results = self.get_batch_errors(configurations)
+        if desc is not None:
+            results = tqdm(results, total = len(configurations), desc = desc, bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}")
+        outs = []
+        for x, configuration, (errors, lut_io_info) in zip(xs, configurations, results):
+            out = {"x": list(x)}
+            self.fill_objectives(out, x, self.prove_errors(configuration, self.error_config.metrics, errors), lut_io_info)
+            self.estimated.discard(self.get_cache_key(out))
+            self.add_to_cache(out)
+            if self.fidelity_size is not None:
+                self.add_to_front(out)
+            outs.append(out)
+        return outs
+
+    def get_batch_errors(self, configurations):
+        """
+        Yields errors and LUT frequencies of each configuration, on the whole sample set. Depending on batch_mode, each
+        worker simulates a whole configuration ("candidates"), configurations are simulated one after another, each one
+        split among workers ("samples"), or they are simulated by this process ("serial").
+        """
+        if self.batch_mode == "samples":
+            return (self.get_errors(c) for c in configurations)
+        if self.error_config.streaming:
+            args = [(self.shared_graph, self.shared_samples, 0, len(self.samples), self.task_configuration(c), self.error_config.metrics, self.output_weights, self.error_config.chunk_size) for c in configurations]
+            results = self.workers.imap(MOP.evaluate_shard_streaming, args) if self.batch_mode == "candidates" else (MOP.evaluate_shard_streaming(*a) for a in args)
+            return (self.merge_accumulators(self.error_config.metrics, [r]) for r in results)
+        args = [(self.shared_graph, self.shared_samples, 0, len(self.samples), self.task_configuration(c)) for c in configurations]
+        results = self.workers.imap(MOP.evaluate_shard, args) if self.batch_mode == "candidates" else (MOP.evaluate_shard(*a) for a in args)
+        return (([self.get_error(m, OutputSet(self.samples, approx)) for m in self.error_config.metrics], lut_io_info) for approx, lut_io_info in results)
+
+    def autotune(self, cache_file = None, n_candidates = 8):
+        """
+        Benchmarks, on n_candidates random configurations of this design and sample set, how candidates are simulated:
+        by this process, or split among an increasing number of shards for the workers, and, with early stop or
+        streaming, in chunks of a few sizes; then, how batches of candidates are simulated (see get_batch_errors()).
+        The fastest settings are kept. They are cached to cache_file, together with the measured evaluations per second,
+        and reused as long as cells, sample set, workers and error metrics do not change.
+        """
+        key = {"cells": [[c["name"], c["spec"]] for c in self.graph.get_cells()], "upper_bound": self.upper_bound, "n_vectors": len(self.samples), "ncpus": self.workers.ncpus,
+               "metrics": [repr(m) for m in self.error_config.metrics], "early_stop": self.error_config.early_stop, "streaming": self.error_config.streaming, "chunk_size": self.error_config.chunk_size}
+        if cache_file is not None and os.path.exists(cache_file):
+            cached = json.load(open(cache_file))
+            if cached["key"] == key:
+                print(f"Reading autotuning results from {cache_file}")
+                self.apply_setup(cached["setup"])
+                print(f"Simulation setup: {MOP.setup_label(self.setup())}, batches by {self.batch_mode}")
+                return
+        rng = np.random.default_rng(0)
+        configurations = [self.matter_configuration([int(rng.integers(0, u + 1)) if rng.random() < 0.3 else 0 for u in self.upper_bound]) for _ in range(n_candidates)]
+        evaluate = self.get_errors_early_stop if self.error_config.early_stop else self.get_errors
+        counters = self.early_stops, self.simulated_samples
+        def throughput(function):
+            function(configurations[:1]) # workers are started, and shared data attached, before timing
+            start = time.time()
+            function(configurations)
+            return len(configurations) / max(time.time() - start, 1e-9)
+        shards = sorted(set([2 ** i for i in range(self.workers.ncpus.bit_length())] + [self.workers.ncpus, 2 * self.workers.ncpus]))
+        chunk_sizes = sorted(set(min(max(256, c), len(self.samples)) for c in [self.error_config.chunk_size // 4, self.error_config.chunk_size, self.error_config.chunk_size * 4])) if self.error_config.early_stop or self.error_config.streaming else [self.error_config.chunk_size]
+        setups = [{"serial": True, "shards": 1, "chunk_size": c, "batch": "candidates"} for c in chunk_sizes] + [{"serial": False, "shards": n, "chunk_size": c, "batch": "candidates"} for n in shards for c in chunk_sizes]
+        results = {"evaluation": {}, "batch": {}}
+        for setup in tqdm(setups, desc = "Autotuning...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}"):
+            self.apply_setup(setup)
+            results["evaluation"][MOP.setup_label(setup)] = throughput(lambda cs: [evaluate(c) for c in cs])
+        best = dict(max(setups, key = lambda s: results["evaluation"][MOP.setup_label(s)]))
+        for mode in ["candidates", "samples", "serial"]:
+            self.apply_setup(best | {"batch": mode})
+            results["batch"][mode] = throughput(lambda cs: list(self.get_batch_errors(cs)))
+        best["batch"] = max(results["batch"], key = results["batch"].get)
+        self.early_stops, self.simulated_samples = counters
+        self.apply_setup(best)
+        for kind, throughputs in results.items():
+            print(f"Throughput ({kind}, evaluations/s): " + ", ".join(f"{k}: {v:.1f}" for k, v in throughputs.items()))
+        print(f"Simulation setup: {MOP.setup_label(best)}, batches by {self.batch_mode}")
+        if cache_file is not None:
+            with open(cache_file, "w") as f:
+                json.dump({"key": key, "setup": best, "throughput": results}, f, indent = 2)
+
+    def setup(self):
+        return {"serial": self.serial, "shards": self.n_shards, "chunk_size": self.error_config.chunk_size, "batch": self.batch_mode}
+
+    @staticmethod
+    def setup_label(setup):
+        return ("serial" if setup["serial"] else f"{setup['shards']} shards") + f", chunks of {setup['chunk_size']}"
+
+    def apply_setup(self, setup):
+        self.serial = setup["serial"]
+        self.n_shards = setup["shards"]
+        self.shards = self.samples.shard_bounds(self.n_shards)
+        self.error_config.chunk_size = setup["chunk_size"]
+        self.batch_mode = setup["batch"]
+
+    def sensitivity_analysis(self, cache_file = None):
+        """
+        Evaluates every single-cell substitution (cell, dist) once, then tail-prunes the upper bound of each variable to
+        the largest distance that does not violate any error threshold on its own. The table is cached to cache_file,
+        and it is reused as long as cells, catalog and error metrics do not change.
+        """
+        # pruning is meaningful only if no entry is added afterwards
+        self.wait_for_catalog()
+        cells = [[c["name"], c["spec"]] for c in self.graph.get_cells()]
+        metrics = [m.name for m in self.error_config.metrics]
+        if cache_file is not None and os.path.exists(cache_file):
+            cached = json.load(open(cache_file))
+            if cached["cells"] == cells and cached["metrics"] == metrics and cached["upper_bound"] == self.upper_bound and cached["n_vectors"] == len(self.samples):
+                print(f"Reading the sensitivity table from {cache_file}")
+                self.sensitivity = cached["sensitivity"]
+        if self.sensitivity is None:
+            xs = [[0] * self.n_vars] + [[d if j == i else 0 for j in range(self.n_vars)] for i in range(self.n_vars) for d in range(1, self.upper_bound[i] + 1)]
+            errors = [out["f"][:len(metrics)] for out in self.evaluate_batch(xs, "Computing sensitivity...")]
+            self.sensitivity = [[errors[0]] for _ in range(self.n_vars)]
+            for x, e in zip(xs[1:], errors[1:]):
+                self.sensitivity[int(np.argmax(x))].append(e)
+            if cache_file is not None:
+                with open(cache_file, "w") as f:
+                    json.dump({"cells": cells, "metrics": metrics, "upper_bound": self.upper_bound, "n_vectors": len(self.samples), "sensitivity": self.sensitivity}, f)
+        upper_bound = [max(d for d, e in enumerate(s) if d == 0 or all(v <= t for v, t in zip(e, self.error_config.thresholds))) for s in self.sensitivity]
+        print(f"Sensitivity analysis pruned {sum(self.upper_bound) - sum(upper_bound)} catalog entries. ub:{upper_bound}, #conf.s {np.prod([ float(x + 1) for x in upper_bound ])}.")
+        self.upper_bound[:] = upper_bound
+
+    def additive_estimates(self, x):
+        """
+        Estimates error metrics of x by adding up the contribution of each substitution on its own. This is no bound,
+        just a cheap estimate, since errors introduced by different cells may either add up or mask each other.
+        """
+        base = np.array(self.sensitivity[0][0], dtype = float)
+        estimates = base + np.sum([np.array(self.sensitivity[i][d], dtype = float) - base for i, d in enumerate(x) if d > 0], axis = 0)
+        return [min(e, 1.0) if m == ErrorConfig.Metric.EPROB else e for e, m in zip(np.atleast_1d(estimates).tolist(), self.error_config.metrics)]
+
+    def screen(self, x):
+        """
+        Returns additive error estimates for x, if they exceed at least one threshold by the configured screening factor,
+        so that x can be rejected without simulating it; None otherwise.
+        """
+        if self.sensitivity is None or self.error_config.screening is None:
+            return None
+        estimates = self.additive_estimates(x)
+        if any(t > 0 and e > self.error_config.screening * t for e, t in zip(estimates, self.error_config.thresholds)):
+            self.screened += 1
+            return estimates
+        return None
+
+    def estimate_lut_io_info(self, configuration):
+        # input frequencies of the exact circuit, with approximate specifications
+        return {k: {"spec": configuration[k]["axspec"], "freq": v["freq"]} for k, v in self.reference_lut_io_info.items() if k in configuration}
 
     def evaluate_ffs(self, x):
         out = { "f" : [], "g": []}
         configuration = self.matter_configuration(x)
-        outputs, lut_io_info = self.get_outputs(configuration)
-        if self.output_weights is not None:
-            for metric in self.error_ffs.values():
-                out["f"].append(getattr(self, metric)(outputs, self.output_weights))
+        custom = [m for m in self.error_config.metrics if isinstance(m, CustomMetric)]
+        # the variance of the error distance on weighted samples is not a running variance, see get_vared()
+        if self.error_config.streaming and self.samples.weights is None:
+            metrics = (list(self.error_ffs.keys()) if self.output_weights is not None else [ErrorConfig.Metric.EPROB]) + custom
+            errors, lut_io_info = self.get_errors_streaming(configuration, metrics)
+            out["f"] += self.prove_errors(configuration, metrics, errors)
         else:
-            out["f"].append(self.get_ep(outputs, self.output_weights))
+            outputs, lut_io_info = self.get_outputs(configuration)
+            if self.output_weights is not None:
+                out["f"] += self.prove_errors(configuration, self.error_ffs.keys(), [getattr(self, metric)(outputs, self.output_weights) for metric in self.error_ffs.values()])
+            else:
+                out["f"].append(self.get_ep(outputs, self.output_weights))
+            for metric in custom:
+                out["f"].append(metric(outputs, self.output_weights))
         for metric in self.hw_ffs.values():
-            out["f"].append(metric(configuration, lut_io_info, self.graph))
+            out["f"].append(getattr(self.hw_engine, metric)(x, self.compact_catalog(), lut_io_info))
         return out
 
     def generate_samples(self):
-        self.samples = []
-        PIs = self.graph.get_pi()
-        lut_io_info = {}
+        pi_names = [pi["name"] for pi in self.graph.get_pi()]
         if self.error_config.n_vectors is None or self.error_config.n_vectors == 0:
-            self.error_config.n_vectors = 2 ** len(PIs)
-        
-        input_assignments = []
-        if len(PIs) >= 16:
-            pbar = tqdm(total = self.error_config.n_vectors, desc = f"Generating input assignment...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}")
-            while len(input_assignments) < self.error_config.n_vectors:
-                random_boolean_list = random.choices([True, False], k = len(PIs))
-                if random_boolean_list not in input_assignments:
-                    input_assignments.append(random_boolean_list)
-                    pbar.update(1)
-            pbar.close()
+            self.error_config.n_vectors = 2 ** len(pi_names)
+        weights, strata = None, None
+        if self.error_config.sampling != "uniform" and self.error_config.n_vectors < 2 ** len(pi_names):
+            input_assignments, weights, strata = getattr(self, f"{self.error_config.sampling}_samples")(pi_names, self.error_config.n_vectors)
+        elif len(pi_names) >= 16:
+            self.error_config.n_vectors = min(self.error_config.n_vectors, 2 ** len(pi_names))
+            input_assignments = pack(MOP.random_assignments(len(pi_names), self.error_config.n_vectors))
         else:
-            input_assignments = [list(i) for i in  tqdm(itertools.product([False, True], repeat = len(PIs)), total = 2 ** len(PIs), desc = f"Generating input assignment...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}") ]
-            if self.error_config.n_vectors != 2 ** len(PIs):
-                random.shuffle(input_assignments)
-                input_assignments = input_assignments[: self.error_config.n_vectors]
-        for assignment in tqdm(input_assignments, desc = "Computing the reference output...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}"):
-            inputs = {pi["name"]: value for pi, value in zip(PIs, assignment)}
-            output, lut_io_info = self.graph.evaluate(inputs, lut_io_info)
-            self.samples.append({"input": inputs, "output": output})
+            # same order as itertools.product([False, True], repeat = len(pi_names)), i.e., the first PI is the msb
+            counter = np.arange(2 ** len(pi_names))
+            input_assignments = pack((counter[:, None] >> np.arange(len(pi_names) - 1, -1, -1)) & 1)
+            if self.error_config.n_vectors != 2 ** len(pi_names):
+                input_assignments = np.random.permutation(input_assignments)[: self.error_config.n_vectors]
+        self.samples = SampleSet(pi_names, [po["name"] for po in self.graph.get_po()], input_assignments, None, weights, strata)
+        lut_io_info = self.compute_reference_outputs()
+        if weights is not None or strata is not None:
+            print(f"{self.error_config.sampling.capitalize()} sampling: {len(self.samples)} vectors, Kish effective size {self.samples.kish_size():.0f}")
         return lut_io_info
+
+    @staticmethod
+    def random_assignments(n_bits, k):
+        """
+        Returns k distinct random assignments of n_bits bits, as a boolean matrix.
+        """
+        if k == 0 or n_bits == 0:
+            return np.zeros((k, n_bits), dtype = bool)
+        if n_bits <= 62:
+            counter = np.random.default_rng(np.random.randint(2**31)).choice(2 ** n_bits, k, replace = False)
+            return ((counter[:, None] >> np.arange(n_bits - 1, -1, -1)) & 1).astype(bool)
+        assignments = np.zeros((0, (n_bits + 7) // 8), dtype = np.uint8)
+        while len(assignments) < k:
+            random_assignments = pack(np.random.randint(0, 2, size = (k - len(assignments), n_bits), dtype = np.uint8))
+            assignments = np.unique(np.concatenate([assignments, random_assignments]), axis = 0)
+        return unpack(np.random.permutation(assignments), n_bits)
+
+    def disagreement_tables(self):
+        """
+        Returns, for each LUT (by name), which of its input patterns have the output of any of its approximate
+        implementations differing from the exact one.
+        """
+        tables = {c["name"]: np.zeros(len(c["spec"]), dtype = bool) for c in self.graph.get_cells()}
+        for d in range(1, max(self.upper_bound, default = 0) + 1):
+            for name, c in self.matter_configuration([min(d, u) for u in self.upper_bound]).items():
+                tables[name] |= Simulator.truth_table(c["axspec"]) != Simulator.truth_table(c["spec"])
+        return tables
+
+    def stratified_samples(self, pi_names, k):
+        """
+        Stratified sampling: input vectors are partitioned into strata by the values of the primary inputs feeding most
+        of the approximable LUTs, and each stratum gets a share of the k distinct samples proportional to its size.
+        """
+        support = Simulator.of(self.graph).support()
+        approximable = [c["name"] for c, u in zip(self.graph.get_cells(), self.upper_bound) if u > 0]
+        ranking = sorted(range(len(pi_names)), key = lambda i: -sum(pi_names[i] in support[c] for c in approximable))
+        s = min(self.error_config.strata, len(pi_names), int(np.log2(k)))
+        stratifying, others = ranking[:s], ranking[s:]
+        n_strata = 2 ** s
+        sizes = np.full(n_strata, k // n_strata)
+        sizes[np.random.choice(n_strata, k % n_strata, replace = False)] += 1
+        bits = np.zeros((k, len(pi_names)), dtype = bool)
+        strata = np.repeat(np.arange(n_strata), sizes)
+        bits[:, stratifying] = (strata[:, None] >> np.arange(s - 1, -1, -1)) & 1
+        begin = 0
+        for size in sizes:
+            bits[begin:begin + size][:, others] = MOP.random_assignments(len(others), size)
+            begin += size
+        weights = k / (n_strata * sizes[strata])
+        order = np.random.permutation(k)
+        return pack(bits[order]), None if np.all(weights == 1) else weights[order], strata[order]
+
+    def importance_samples(self, pi_names, k, chunk_size = 2**16):
+        """
+        Two-phase importance sampling: a uniform pool of distinct input vectors (at most 8k) is simulated on the exact
+        circuit, and each vector is scored by the number of LUTs getting an input pattern on which some approximation
+        differs from the exact LUT. Then, k draws are taken from the pool, with probabilities proportional to the score,
+        mixed with the uniform distribution so that no vector is unreachable. Duplicate draws are merged, and weights
+        account for both the draw probability and the multiplicity.
+        """
+        pool = pack(MOP.random_assignments(len(pi_names), min(2 ** len(pi_names), 8 * k)))
+        pool_samples = SampleSet(pi_names, [], pool)
+        tables = self.disagreement_tables()
+        score = np.zeros(len(pool))
+        for begin in tqdm(range(0, len(pool), chunk_size), desc = "Scoring input vectors...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}"):
+            for name, index in Simulator.of(self.graph).patterns(pool_samples[begin:begin + chunk_size]).items():
+                score[begin:begin + len(index)] += tables[name][index]
+        probability = (score + np.mean(score)) if np.any(score) else np.ones(len(pool))
+        probability /= np.sum(probability)
+        drawn, counts = np.unique(np.random.choice(len(pool), k, p = probability), return_counts = True)
+        weights = len(drawn) * counts / (k * len(pool) * probability[drawn])
+        order = np.random.permutation(len(drawn))
+        return pool[drawn[order]], weights[order], None
+
+    def compute_reference_outputs(self):
+        print("Computing the reference output...")
+        self.samples.outputs, lut_io_info = self.simulate_exact(self.samples)
+        self.check_simulator(self.samples, self.samples.outputs)
+        return lut_io_info
+
+    def simulate_exact(self, samples):
+        # chunk by chunk, so that the signals of the nodes are never held for the whole sample set
+        outputs, lut_io_info = None, {}
+        for begin in range(0, len(samples), self.error_config.chunk_size):
+            end = min(begin + self.error_config.chunk_size, len(samples))
+            chunk_outputs, chunk_io_info = Simulator.of(self.graph).evaluate(samples[begin:end])
+            if outputs is None:
+                outputs = np.empty((len(samples),) + chunk_outputs.shape[1:], dtype = chunk_outputs.dtype)
+            outputs[begin:end] = chunk_outputs
+            lut_io_info = MOP.merge_lut_io_info([lut_io_info, chunk_io_info]) if lut_io_info else chunk_io_info
+        return outputs, lut_io_info
+
+    def check_simulator(self, samples, outputs, n = 64):
+        # cross-check against the per-sample evaluation of ALSGraph on a few samples
+        for i in range(min(n, len(samples))):
+            output, _ = self.graph.evaluate(samples[i]["input"], {})
+            assert output == samples.output_dict(outputs[i]), f"Simulation mismatch on sample {samples[i]['input']}: {output} vs. {samples.output_dict(outputs[i])}"
     
     def store_samples(self, outfile):
         with open(outfile, 'w') as f:
-            json.dump(self.samples, f)
+            json.dump(self.samples.to_dicts(), f)
 
     def matter_configuration(self, x):
-        matter = {}
-        for i, (c, l) in enumerate(zip(x, self.graph.get_cells())):
-            for e in self.catalog:
-                try:
-                    if e[0]["spec"] == l["spec"]:
-                        matter[l["name"]] = {
-                            "dist": c, 
-                            "spec": e[0]["spec"],
-                            "axspec": e[c]["spec"],
-                            "gates": e[c]["gates"],
-                            "S": e[c]["S"],
-                            "P": e[c]["P"],
-                            "out_p": e[c]["out_p"],
-                            "out": e[c]["out"],
-                            "depth": e[c]["depth"]}
-                    if negate(e[0]["spec"]) == l["spec"]:
-                        matter[l["name"]] = {
-                            "dist": c,
-                            "spec": negate(e[0]["spec"]),
-                            "axspec": negate(e[c]["spec"]),
-                            "gates": e[c]["gates"],
-                            "S": e[c]["S"],
-                            "P": e[c]["P"],
-                            "out_p": 1 - e[c]["out_p"],
-                            "out": e[c]["out"],
-                            "depth": e[c]["depth"]}
-                except IndexError as err:
-                    print(err)
-                    print(f"Configuration: {x}")
-                    print(f"Upper bound: {self.upper_bound}")
-                    print(f"Configuration[{i}]: {c}")
-                    print(f"Upper bound[{i}]: {self.upper_bound[i]}")
-                    print(f"Cell: {l}")
-                    print(f"Catalog Entries #: {len(e)}")
-                    print(f"Catalog Entries: {e}")
-                    exit()
-        return matter
+        catalog = self.compact_catalog()
+        try:
+            return {l["name"]: catalog.configuration(l["spec"], c) for c, l in zip(x, self.graph.get_cells())}
+        except IndexError as err:
+            if hasattr(self.catalog, "complete") and not self.catalog.complete():
+                # e.g., a configuration from a previous run, whose entries are still being synthesized
+                self.wait_for_catalog()
+                return self.matter_configuration(x)
+            print(err)
+            print(f"Configuration: {x}")
+            print(f"Upper bound: {self.upper_bound}")
+            exit()
+
+    def compact_catalog(self):
+        # entries added to catalogs synthesized in background (see StreamingCatalog) are compacted as they arrive
+        if self.compact.version != getattr(self.catalog, "version", None):
+            self.compact = self.compact.extend(self.catalog)
+        return self.compact
+
+    def share_catalog(self):
+        # once the catalog stops growing, workers attach it, and they get the distance of each cell rather than records
+        if self.shared_catalog is None and self.workers is not None and (not hasattr(self.catalog, "complete") or self.catalog.complete()):
+            self.shared_catalog = self.workers.share(self.compact_catalog()), self.workers.share([(c["name"], c["spec"]) for c in self.graph.get_cells()])
+
+    def task_configuration(self, configuration):
+        if self.serial or self.shared_catalog is None:
+            return configuration
+        return LazyConfiguration(*self.shared_catalog, [c["dist"] for c in configuration.values()])
 
     def plot_labels(self):
-        return [self.error_labels[m] for m in self.error_config.metrics] + [self.hw_labels[m] for m in self.hw_config.metrics] if self.error_config.builtin_metric else ["Error"] + [self.hw_labels[m] for m in self.hw_config.metrics]
+        return [self.error_label(m) for m in self.error_config.metrics] + [self.hw_labels[m] for m in self.hw_config.metrics]
 
     def get_upper_bound(self):
-        return [len(e) - 1 for c in [{"name": c["name"], "spec": c["spec"]} for c in self.graph.get_cells()] for e in self.catalog if e[0]["spec"] == c["spec"] or negate(e[0]["spec"]) == c["spec"] ]
+        catalog = self.compact_catalog()
+        return [catalog.entries(c["spec"]) - 1 for c in self.graph.get_cells()]
+
+    def share_with_workers(self):
+        # The graph and the samples are placed in shared memory (or handed to the broker) once; tasks only carry handles
+        # and sample ranges. Any backend providing share(), starmap(), imap() and ncpus can be set as self.workers.
+        if self.workers is None:
+            self.workers = WorkerPool(self.ncpus)
+        self.shared_graph = self.workers.share(self.graph)
+        self.shared_samples = self.workers.share(self.samples)
+        self.samples = self.shared_samples.get()
+        self.n_shards = self.workers.ncpus if self.n_shards is None else self.n_shards
+        self.shards = self.samples.shard_bounds(self.n_shards)
+        self.share_catalog()
+
+    def get_accumulators(self, metrics = None):
+        accumulators = []
+        for m in self.error_config.metrics if metrics is None else metrics:
+            if isinstance(m, CustomMetric):
+                accumulators.append(MaxAccumulator() if m.reduction == "max" else MeanAccumulator(m.nonnegative))
+                continue
+            _, accumulator, nonnegative = self.error_accumulators[m]
+            if m == ErrorConfig.Metric.WSBEP:
+                nonnegative = all(float(w) >= 0 for w in self.output_weights.values())
+            transform = (lambda rs: self.ep_upper_bound(rs, self.effective_vectors(self.samples))) if m == ErrorConfig.Metric.EPROB else np.sqrt if m == ErrorConfig.Metric.RMSED else None
+            accumulators.append(accumulator() if accumulator is MaxAccumulator else accumulator(nonnegative, transform))
+        return accumulators
+
+    def get_errors_early_stop(self, configuration):
+        """
+        Simulates samples chunk by chunk, and stops as soon as any error constraint is violated for sure (AWCE, WRE, and
+        means of non-negative quantities) or with the configured confidence (means). Metrics are then estimated on the
+        samples simulated so far; the estimate of the violated metric exceeds its threshold, so the candidate is still
+        marked as unfeasible. Returns errors, LUT frequencies, and whether the simulation stopped early.
+        """
+        accumulators = self.get_accumulators()
+        z = norm.ppf(self.error_config.confidence)
+        lut_io_info = {}
+        for begin in range(0, len(self.samples), self.error_config.chunk_size):
+            end = min(begin + self.error_config.chunk_size, len(self.samples))
+            outputs, chunk_io_info = self.get_outputs(configuration, begin, end)
+            lut_io_info = MOP.merge_lut_io_info([lut_io_info, chunk_io_info]) if lut_io_info else chunk_io_info
+            self.simulated_samples += end - begin
+            for m, accumulator in zip(self.error_config.metrics, accumulators):
+                quantities = self.get_error_quantities(m, outputs)
+                accumulator.update(quantities if isinstance(accumulator, MaxAccumulator) else outputs.samples.weighted(quantities))
+            if end < len(self.samples) and any(a.lower_bound(len(self.samples), z) > t for a, t in zip(accumulators, self.error_config.thresholds)):
+                self.early_stops += 1
+                return [a.value() for a in accumulators], lut_io_info, True
+        return [a.value() for a in accumulators], lut_io_info, False
+
+    def get_errors_streaming(self, configuration, metrics, begin = 0, partials = []):
+        """
+        Each worker simulates its shard of the samples chunk by chunk, and feeds each chunk to partial accumulators of
+        the error metrics, which are then merged: neither outputs nor per-sample errors of the whole sample set are
+        ever held in memory. Only samples from begin on are simulated, partials being the (accumulators, lut_io_info)
+        of the previous ones.
+        """
+        shards = self.shards if begin == 0 else self.samples.shard_bounds(self.n_shards, begin)
+        configuration = self.task_configuration(configuration)
+        results = self.starmap(MOP.evaluate_shard_streaming, [(self.shared_graph, self.shared_samples, start, stop, configuration, metrics, self.output_weights, self.error_config.chunk_size) for start, stop in shards])
+        return self.merge_accumulators(metrics, partials + results)
+
+    def merge_accumulators(self, metrics, results):
+        accumulators = self.get_accumulators(metrics)
+        for partials, _ in results:
+            for accumulator, partial in zip(accumulators, partials):
+                accumulator.merge(partial)
+        self.simulated_samples += accumulators[0].n if accumulators else 0
+        return [a.value() for a in accumulators], MOP.merge_lut_io_info([r[1] for r in results])
+
+    def starmap(self, function, args):
+        # simulating in this process saves inter-process communication, which dominates on small circuits (see autotune())
+        return [function(*a) for a in args] if self.serial else self.workers.starmap(function, args)
+
+    @staticmethod
+    def partial_accumulators(metrics):
+        # partial accumulators have no transform, which the merging side applies
+        return [MaxAccumulator() if (m.reduction == "max" if isinstance(m, CustomMetric) else MOP.error_accumulators[m][1] is MaxAccumulator) else MeanAccumulator() for m in metrics]
 
     @staticmethod
-    def evaluate_output(graph, samples, configuration):
+    def accumulate(accumulators, metrics, outputs, weights):
+        for m, accumulator in zip(metrics, accumulators):
+            quantities = MOP.error_quantities(m, outputs, weights)
+            accumulator.update(quantities if isinstance(accumulator, MaxAccumulator) else outputs.samples.weighted(quantities))
+
+    @staticmethod
+    def evaluate_shard_streaming(shared_graph, shared_samples, start, stop, configuration, metrics, weights, chunk_size):
+        accumulators = MOP.partial_accumulators(metrics)
         lut_io_info = {}
-        outputs = []
-        for s in samples:
-            ax_output, lut_io_info = graph.evaluate(s["input"], lut_io_info, configuration)
-            outputs.append({"i" : s["input"], "e" : s["output"], "a" : ax_output })
-        return outputs, lut_io_info
+        for begin in range(start, stop, chunk_size):
+            end = min(begin + chunk_size, stop)
+            approx, chunk_io_info = MOP.evaluate_shard(shared_graph, shared_samples, begin, end, configuration)
+            lut_io_info = MOP.merge_lut_io_info([lut_io_info, chunk_io_info]) if lut_io_info else chunk_io_info
+            MOP.accumulate(accumulators, metrics, OutputSet(shared_samples.get()[begin:end], approx), weights)
+        return accumulators, lut_io_info
 
-    def get_outputs(self, configuration):
-        for a in self._args:
-            a[2] = configuration
-        with Pool(self.ncpus) as pool:
-            outputs = pool.starmap(MOP.evaluate_output, self._args)
-        out = [o[0] for o in outputs]
-        swc = [o[1] for o in outputs]
+    @staticmethod
+    def evaluate_shard(shared_graph, shared_samples, start, stop, configuration):
+        graph = shared_graph.get()
+        if getattr(type(graph), "cell_values_base", None) is None:
+            # fresh (spawned or remote) process: ALSGraph initializes its class-level constants on deepcopy only
+            type(graph).cell_values_base = None
+            copy.deepcopy(graph)
+        return Simulator.of(graph).evaluate(shared_samples.get()[start:stop], configuration, (start, stop))
+
+    def get_outputs(self, configuration, begin = 0, end = None):
+        shards = self.shards if begin == 0 and end is None else self.samples.shard_bounds(self.n_shards, begin, end)
+        configuration = self.task_configuration(configuration)
+        outputs = self.starmap(MOP.evaluate_shard, [(self.shared_graph, self.shared_samples, start, stop, configuration) for start, stop in shards])
+        return OutputSet.concatenate(self.samples[begin:end], [o[0] for o in outputs]), MOP.merge_lut_io_info([o[1] for o in outputs])
+
+    @staticmethod
+    def merge_lut_io_info(swc):
         lut_io_info = {}
         for k in swc[0].keys():
-            C = [s[k]["freq"] for s in swc if k in s.keys()]
-            lut_io_info[k] = { "spec": swc[0][k]["spec"], "freq" : [sum(x) for x in zip(*C)]}
-        return list(flatten(out)), lut_io_info
+            lut_io_info[k] = { "spec": swc[0][k]["spec"], "freq" : np.sum([s[k]["freq"] for s in swc if k in s.keys()], axis = 0)}
+        return lut_io_info
 
     def get_baseline_gates(self, lut_io_info):
         return get_gates(self.matter_configuration([0] * self.n_vars), lut_io_info, self.graph)
@@ -230,9 +827,17 @@ class MOP(pyamosa.Problem):
         return get_switching(self.matter_configuration([0] * self.n_vars), lut_io_info, self.graph)
 
     def get_ep(self, outputs, weights):
-        rs = sum(o["e"] != o["a"] for o in outputs) / len(outputs)
-        if self.error_config.n_vectors != 0:
-            return float(np.min([1.0, rs + 4.5 / self.error_config.n_vectors * (1 + np.sqrt(1 + 4 / 9 * self.error_config.n_vectors * rs * (1 - rs)))]))
+        mask = outputs.error_mask()
+        return self.ep_upper_bound(float(outputs.samples.mean(mask)), self.effective_vectors(outputs.samples, mask))
+
+    def effective_vectors(self, samples, values = None):
+        # uniformly drawn samples count as they are; otherwise, the uniform sample size giving the same variance is used
+        return self.error_config.n_vectors if samples.weights is None and samples.strata is None else samples.effective_size(values)
+
+    @staticmethod
+    def ep_upper_bound(rs, n_vectors):
+        if n_vectors != 0:
+            return float(np.min([1.0, rs + 4.5 / n_vectors * (1 + np.sqrt(1 + 4 / 9 * n_vectors * rs * (1 - rs)))]))
         else:
             return float(rs)
         
@@ -243,86 +848,100 @@ class MOP(pyamosa.Problem):
     
     @staticmethod
     def evaluate_bep(output_vectors, bit_weights):
-        return { po : np.sum([1 if o["e"][po] != o["a"][po] else 0 for o in output_vectors]) / len(output_vectors) for po in bit_weights }
+        bit_errors = output_vectors.samples.mean(output_vectors.bit_errors(), axis = 0)
+        return { po : bit_errors[output_vectors.samples.po_index[po]] for po in bit_weights }
         
     @staticmethod
     def evaluate_abs_ed(outputs, weights):
-        return [np.abs( bool_to_value(o["e"], weights) - bool_to_value(o["a"], weights) ) for o in outputs] if weights is not None else [0]
+        return np.abs(outputs.exact_values(weights) - outputs.approx_values(weights)) if weights is not None else np.zeros(1)
 
     @staticmethod
     def evaluate_signed_ed(outputs, weights):
-        return [bool_to_value(o["a"], weights) - bool_to_value(o["e"], weights) for o in outputs] if weights is not None else [0] 
+        return outputs.approx_values(weights) - outputs.exact_values(weights) if weights is not None else np.zeros(1)
 
     @staticmethod
     def evaluate_squared_ed(outputs, weights):
-        return [( bool_to_value(o["e"], weights) - bool_to_value(o["a"], weights))**2 for o in outputs] if weights is not None else [0]
+        return (outputs.exact_values(weights) - outputs.approx_values(weights)) ** 2 if weights is not None else np.zeros(1)
 
     @staticmethod
     def evaluate_relative_ed(outputs, weights):
         if weights is None:
-            return [0]
-        err = []
-        for o in outputs:
-            f =  float(bool_to_value(o["e"], weights))
-            axf = float(bool_to_value(o["a"], weights))
-            err.append(np.abs(f - axf) / (1 if np.abs(f) <= np.finfo(float).eps else f))
-        return err
+            return np.zeros(1)
+        f = outputs.exact_values(weights)
+        axf = outputs.approx_values(weights)
+        return np.abs(f - axf) / np.where(np.abs(f) <= np.finfo(float).eps, 1, f)
     
     @staticmethod
     def evaluate_abs_relative_ed(outputs, weights):
-        if weights is None:
-            return [0]
-        err = []
-        for o in outputs:
-            f =  float(bool_to_value(o["e"], weights))
-            axf = float(bool_to_value(o["a"], weights))
-            err.append(np.abs((f - axf) / (1 if np.abs(f) <= np.finfo(float).eps else f)))
-        return err
+        return np.abs(MOP.evaluate_relative_ed(outputs, weights))
+
+    @staticmethod
+    def evaluate_error_mask(outputs, weights):
+        return outputs.error_mask()
+
+    @staticmethod
+    def evaluate_weighted_bit_errors(outputs, bit_weights):
+        return outputs.bit_errors() @ weight_vector(outputs.samples.po_names, {po: bit_weights.get(po, 0) for po in outputs.samples.po_names})
+
+    @staticmethod
+    def evaluate_rounded_abs_ed(outputs, weights, decimals = 2):
+        return np.round(MOP.evaluate_abs_ed(outputs, weights), decimals)
+
+    @staticmethod
+    def evaluate_rounded_signed_ed(outputs, weights, decimals = 2):
+        return np.round(MOP.evaluate_signed_ed(outputs, weights), decimals)
+
+    @staticmethod
+    def evaluate_rounded_relative_ed(outputs, weights, decimals = 2):
+        return np.round(MOP.evaluate_relative_ed(outputs, weights), decimals)
 
     def get_awce(self, outputs, weights):
         return np.max(MOP.evaluate_abs_ed(outputs, weights))
 
     def get_mae(self, outputs, weights):
-        return np.mean(MOP.evaluate_abs_ed(outputs, weights))
+        return outputs.samples.mean(MOP.evaluate_abs_ed(outputs, weights))
 
     def get_mre(self, outputs, weights):
-        return np.mean(MOP.evaluate_relative_ed(outputs, weights))
+        return outputs.samples.mean(MOP.evaluate_relative_ed(outputs, weights))
     
     def get_mare(self, outputs, weights):
-        return np.mean(MOP.evaluate_abs_relative_ed(outputs, weights))
+        return outputs.samples.mean(MOP.evaluate_abs_relative_ed(outputs, weights))
 
     def get_wre(self, outputs, weights):
         return np.max(MOP.evaluate_relative_ed(outputs, weights))
 
     def get_mse(self, outputs, weights):
-        return np.mean(MOP.evaluate_squared_ed(outputs, weights))
+        return outputs.samples.mean(MOP.evaluate_squared_ed(outputs, weights))
 
     @staticmethod
     def get_error_hystogram(error, decimals = 2):
-        error_hystogram = {}
-        for e in error:
-            index = round(e, decimals)
-            if index in error_hystogram:
-                error_hystogram[index] += 1
-            else:
-                error_hystogram[index] = 1
-        return error_hystogram
+        values, counts = np.unique(np.round(error, decimals), return_counts = True)
+        return dict(zip(values.tolist(), counts.tolist()))
            
     @staticmethod     
     def get_mxxd(hystogram):
         return np.sum([k * v for k, v in hystogram.items()]) / np.sum(list(hystogram.values()))
 
+    @staticmethod
+    def get_mean_rounded(outputs, error, decimals = 2):
+        if outputs.samples.weights is None:
+            return MOP.get_mxxd(MOP.get_error_hystogram(error, decimals))
+        return outputs.samples.mean(np.round(error, decimals))
+
     def get_med(self, outputs, weights):
-        return MOP.get_mxxd(MOP.get_error_hystogram(MOP.evaluate_abs_ed(outputs, weights)))
+        return MOP.get_mean_rounded(outputs, MOP.evaluate_abs_ed(outputs, weights))
     
     def get_me(self, outputs, weights):
-        return MOP.get_mxxd(MOP.get_error_hystogram(MOP.evaluate_signed_ed(outputs, weights)))
+        return MOP.get_mean_rounded(outputs, MOP.evaluate_signed_ed(outputs, weights))
 
     def get_mred(self, outputs, weights):
-        return MOP.get_mxxd(MOP.get_error_hystogram(MOP.evaluate_relative_ed(outputs, weights)))
+        return MOP.get_mean_rounded(outputs, MOP.evaluate_relative_ed(outputs, weights))
 
     def get_rmsed(self, outputs, weights):
-        return np.sqrt(np.mean(MOP.evaluate_squared_ed(outputs, weights)))
+        return np.sqrt(outputs.samples.mean(MOP.evaluate_squared_ed(outputs, weights)))
 
     def get_vared(self, outputs, weights):
-        return np.var(MOP.evaluate_signed_ed(outputs, weights))
+        error = MOP.evaluate_signed_ed(outputs, weights)
+        if outputs.samples.weights is None:
+            return np.var(error)
+        return max(0.0, outputs.samples.mean(error ** 2) - outputs.samples.mean(error) ** 2)
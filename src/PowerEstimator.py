@@ -0,0 +1,188 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import re, json, functools, numpy as np
+from .LybertySynth import *
+
+class PowerEstimator:
+    """
+    Vector-based power estimation of gate-level netlists, replacing the vsim/PrimeTime flow of resources/do_sim.sh.
+    Each netlist is synthesized on the Liberty cells, and simulated on the testbench stimuli (see TbGenerator), the
+    signal of each net being bit-packed, one bit per vector, so that cells are evaluated by bitwise operations on whole
+    arrays. Toggles of each net are then counted between consecutive vectors, the testbench starting from all-zero
+    inputs, and combined with Liberty data:
+     - switching power is 1/2 C V^2 toggles / time, C being the input capacitance of the cells a net drives;
+     - internal power is the average internal energy of each output pin, per toggle of the pin;
+     - leakage power is the sum of cell_leakage_power.
+    Each vector is applied for delay ns, as in the testbench.
+    """
+    hex_digits = np.full(256, 255, dtype = np.uint8)
+    hex_digits[np.frombuffer(b"0123456789abcdef", dtype = np.uint8)] = np.arange(16)
+    hex_digits[np.frombuffer(b"ABCDEF", dtype = np.uint8)] = np.arange(10, 16)
+    popcount = np.array([bin(i).count("1") for i in range(256)], dtype = np.int64)
+
+    def __init__(self, liberty, delay = 10):
+        self.synthesizer = LibertySynth(liberty)
+        self.delay = delay
+
+    @staticmethod
+    def read_stimuli(stimuli_file, pis):
+        """
+        Reads a $readmemh/$readmemb stimuli file, as written by TbGenerator, and returns the bit-packed signal of each
+        primary-input bit, as {(name, bit): array}. Vectors are the concatenation of pis, the first one being the msb.
+        """
+        width = sum(pi["width"] for pi in pis)
+        with open(stimuli_file, "rb") as f:
+            lines = f.read().split()
+        chars = np.frombuffer(b"".join(lines), dtype = np.uint8).reshape(len(lines), -1)
+        if chars.shape[1] == width and np.all((chars == ord("0")) | (chars == ord("1"))):
+            bits = chars == ord("1")
+        else:
+            nibbles = PowerEstimator.hex_digits[chars]
+            assert np.all(nibbles < 16), f"{stimuli_file}: unsupported stimuli format"
+            bits = ((nibbles[:, :, None] >> np.arange(3, -1, -1)) & 1).reshape(len(lines), -1)[:, -width:].astype(bool)
+        # the testbench applies all-zero inputs before the first vector
+        bits = np.vstack([np.zeros((1, width), dtype = bool), bits])
+        signals, offset = {}, 0
+        for pi in pis:
+            for b in range(pi["width"]):
+                signals[(pi["name"], b)] = np.packbits(bits[:, offset + pi["width"] - 1 - b], bitorder = "little")
+            offset += pi["width"]
+        return signals, len(bits)
+
+    @staticmethod
+    @functools.lru_cache(maxsize = None)
+    def compile_function(function):
+        """
+        Parses a Liberty function, and returns a callable computing it on a {pin: bit-packed signal} dictionary.
+        Operators are, from the highest precedence: ! and ' (not), ^ (xor), & * and juxtaposition (and), | + (or).
+        """
+        tokens = re.findall(r"[A-Za-z_][A-Za-z0-9_\[\]\.]*|[01]|[!'^&*|+()]", function)
+        position = 0
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+        def take():
+            nonlocal position
+            position += 1
+            return tokens[position - 1]
+        def disjunction():
+            terms = [conjunction()]
+            while peek() in ("|", "+"):
+                take()
+                terms.append(conjunction())
+            return terms[0] if len(terms) == 1 else lambda s, terms = terms: functools.reduce(np.bitwise_or, [t(s) for t in terms])
+        def conjunction():
+            terms = [exclusive()]
+            while peek() in ("&", "*") or (peek() is not None and peek() not in ("|", "+", ")", "^", "'")):
+                if peek() in ("&", "*"):
+                    take()
+                terms.append(exclusive())
+            return terms[0] if len(terms) == 1 else lambda s, terms = terms: functools.reduce(np.bitwise_and, [t(s) for t in terms])
+        def exclusive():
+            terms = [negation()]
+            while peek() == "^":
+                take()
+                terms.append(negation())
+            return terms[0] if len(terms) == 1 else lambda s, terms = terms: functools.reduce(np.bitwise_xor, [t(s) for t in terms])
+        def negation():
+            if peek() == "!":
+                take()
+                operand = negation()
+                return lambda s: ~operand(s)
+            operand = primary()
+            while peek() == "'":
+                take()
+                operand = lambda s, operand = operand: ~operand(s)
+            return operand
+        def primary():
+            token = take()
+            if token == "(":
+                operand = disjunction()
+                assert take() == ")", f"{function}: unbalanced parentheses"
+                return operand
+            if token in ("0", "1"):
+                return lambda s, value = np.uint8(255 if token == "1" else 0): value
+            return lambda s: s[token]
+        operand = disjunction()
+        assert position == len(tokens), f"{function}: unexpected {tokens[position]}"
+        return operand
+
+    @staticmethod
+    def cells(module):
+        # scope-information cells, kept by flattening, are not logic
+        return {c: cell for c, cell in module["cells"].items() if cell["type"] != "$scopeinfo"}
+
+    def simulate(self, module, stimuli, nbytes):
+        """
+        Simulates a mapped netlist (a module of a Yosys Json netlist), and returns the bit-packed signal of each net.
+        """
+        nets = {"0": np.zeros(nbytes, dtype = np.uint8), "1": np.full(nbytes, 255, dtype = np.uint8), "x": np.zeros(nbytes, dtype = np.uint8)}
+        for name, port in module["ports"].items():
+            if port["direction"] == "input":
+                for b, net in enumerate(port["bits"]):
+                    nets[net] = stimuli[(name, b)]
+        pending = PowerEstimator.cells(module)
+        while pending:
+            ready = [c for c, cell in pending.items() if all(net in nets for pin, bits in cell["connections"].items() if pin in self.synthesizer.cell_inputs.get(cell["type"], {}) for net in bits)]
+            assert ready, f"Combinational loop, or unsupported cells, among {sorted(set(cell['type'] for cell in pending.values()))}"
+            for c in ready:
+                cell = pending.pop(c)
+                assert cell["type"] in self.synthesizer.cell_outputs, f"{cell['type']} is not a Liberty cell"
+                inputs = {pin: nets[bits[0]] for pin, bits in cell["connections"].items() if pin in self.synthesizer.cell_inputs[cell["type"]]}
+                for pin, function in self.synthesizer.cell_outputs[cell["type"]].items():
+                    if pin in cell["connections"]:
+                        nets[cell["connections"][pin][0]] = np.broadcast_to(PowerEstimator.compile_function(function)(inputs), nbytes)
+        return nets
+
+    @staticmethod
+    def toggles(signal, n):
+        # transitions between consecutive bits of a bit-packed signal of n bits
+        previous = (signal << 1) | np.concatenate([[0], signal[:-1] >> 7]).astype(np.uint8)
+        transitions = signal ^ previous
+        transitions[0] &= 0xfe
+        if n % 8:
+            transitions[-1] &= (1 << (n % 8)) - 1
+        return int(np.sum(PowerEstimator.popcount[transitions]))
+
+    def estimate(self, module, stimuli, n):
+        """
+        Returns area, internal, switching, leakage and total power (in mW) of a mapped netlist, on stimuli of n vectors.
+        """
+        nets = self.simulate(module, stimuli, (n + 7) // 8)
+        time = (n - 1) * self.delay * 1e-9
+        load, area, internal, leakage = {}, 0, 0, 0
+        for cell in PowerEstimator.cells(module).values():
+            area += self.synthesizer.cell_area[cell["type"]]
+            leakage += self.synthesizer.cell_leakage[cell["type"]]
+            for pin, bits in cell["connections"].items():
+                if pin in self.synthesizer.cell_inputs[cell["type"]]:
+                    load[bits[0]] = load.get(bits[0], 0) + self.synthesizer.cell_inputs[cell["type"]][pin]
+                elif pin in self.synthesizer.cell_energy[cell["type"]]:
+                    internal += self.synthesizer.cell_energy[cell["type"]][pin] * PowerEstimator.toggles(nets[bits[0]], n)
+        switching = sum(0.5 * c * self.synthesizer.voltage ** 2 * PowerEstimator.toggles(nets[net], n) for net, c in load.items() if net not in ("0", "1", "x"))
+        internal, switching, leakage = internal / time * 1e3, switching / time * 1e3, leakage * 1e3
+        return area, internal, switching, leakage, internal + switching + leakage
+
+    def characterize(self, hdl_source, top_module, stimuli_file, pis):
+        """
+        Synthesizes hdl_source, and estimates its power on the stimuli of the testbench.
+        """
+        json_netlist = f"{hdl_source}.json"
+        self.synthesizer.do_synth(hdl_source, top_module, json_netlist)
+        with open(json_netlist) as f:
+            module = json.load(f)["modules"][top_module]
+        stimuli, n = PowerEstimator.read_stimuli(stimuli_file, pis)
+        return self.estimate(module, stimuli, n)
@@ -98,11 +98,9 @@ class PyModelArithInt:
         result = np.zeros((2**len(self.pis_weights[0]), 2**len(self.pis_weights[1])), dtype = int)
         offset_op1 = 2**(len(self.pis_weights[0])-1) if signed else 0
         offset_op2 = 2**(len(self.pis_weights[1])-1) if signed else 0
-        for o in computed_circuit_outputs:
-            a = int(bool_to_value({ k : i for k, i in o["i"].items() if k in self.pis_weights[0] }, self.pis_weights[0]))
-            b = int(bool_to_value({ k : i for k, i in o["i"].items() if k in self.pis_weights[1] }, self.pis_weights[1]))
-            r = int(bool_to_value(o["a"], self.po_weights))
-            result[a + offset_op1 if signed else a][b + offset_op2 if signed else b] = r
+        a = computed_circuit_outputs.input_values(self.pis_weights[0]).astype(int) + offset_op1
+        b = computed_circuit_outputs.input_values(self.pis_weights[1]).astype(int) + offset_op2
+        result[a, b] = computed_circuit_outputs.approx_values(self.po_weights).astype(int)
         return result, signed, offset_op1, offset_op2
     
     def get_shifted_lut_for_variant_as_mat(self, computed_circuit_outputs, ishift, oshift):
@@ -110,13 +108,9 @@ class PyModelArithInt:
         result = np.zeros((2**(len(self.pis_weights[0]) + ishift), 2**(len(self.pis_weights[1]) + ishift)), dtype = int)
         offset_op1 = 2**(len(self.pis_weights[0])+ishift-1) if signed else 0
         offset_op2 = 2**(len(self.pis_weights[1])+ishift-1) if signed else 0
-
-        for o in computed_circuit_outputs:
-            a = int(bool_to_value({ k : i for k, i in o["i"].items() if k in self.pis_weights[0] }, self.pis_weights[0])) * 2**ishift
-            b = int(bool_to_value({ k : i for k, i in o["i"].items() if k in self.pis_weights[1] }, self.pis_weights[1])) * 2**ishift
-            r = int(bool_to_value(o["a"], self.po_weights)) * 2**oshift
-            for a_fill in range(2**ishift):
-                for b_fill in  range(2**ishift):
-                    result[a + offset_op1 + a_fill if signed else a + a_fill][b + offset_op2 + b_fill if signed else b + b_fill] = r
+        a = computed_circuit_outputs.input_values(self.pis_weights[0]).astype(int) * 2**ishift + offset_op1
+        b = computed_circuit_outputs.input_values(self.pis_weights[1]).astype(int) * 2**ishift + offset_op2
+        r = computed_circuit_outputs.approx_values(self.po_weights).astype(int) * 2**oshift
+        fill = np.arange(2**ishift)
+        result[(a[:, None] + fill)[:, :, None], (b[:, None] + fill)[:, None, :]] = r[:, None, None]
         return result, signed, offset_op1, offset_op2
-        
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import numpy as np
+
+def pack(bits):
+    return np.packbits(np.asarray(bits, dtype = bool), axis = 1, bitorder = "little")
+
+def unpack(packed, count):
+    return np.unpackbits(packed, axis = 1, count = count, bitorder = "little").astype(bool)
+
+def weight_vector(names, weights):
+    return np.array([float(weights[n]) for n in names])
+
+class SampleSet:
+    """
+    Input vectors and reference outputs. Each sample is a row of bit-packed bytes, and signals are mapped to columns
+    (bits) by name, so that slicing and sharding by samples are zero-copy views.
+    Iterating over a SampleSet yields the {"input": {name: bool}, "output": {name: bool}} dicts used by ALSGraph.
+
+    Samples that are not drawn uniformly (see MOP.generate_samples) carry estimator weights, normalized so that the mean
+    of weights * quantity is an unbiased estimate of the mean of the quantity over all the input vectors, and the
+    stratum each of them was drawn from, if any. Weights being None means all of them are 1.
+    """
+    def __init__(self, pi_names, po_names, inputs, outputs = None, weights = None, strata = None):
+        self.pi_names = list(pi_names)
+        self.po_names = list(po_names)
+        self.pi_index = {n: i for i, n in enumerate(self.pi_names)}
+        self.po_index = {n: i for i, n in enumerate(self.po_names)}
+        self.inputs = inputs
+        self.outputs = outputs
+        self.weights = weights
+        self.strata = strata
+
+    @staticmethod
+    def from_bits(pi_names, po_names, input_bits, output_bits = None):
+        return SampleSet(pi_names, po_names, pack(input_bits), None if output_bits is None else pack(output_bits))
+
+    @staticmethod
+    def from_dicts(samples, pi_names, po_names):
+        return SampleSet.from_bits(pi_names, po_names, [[s["input"][n] for n in pi_names] for s in samples], [[s["output"][n] for n in po_names] for s in samples])
+
+    def to_dicts(self):
+        return list(self)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return SampleSet(self.pi_names, self.po_names, self.inputs[key], None if self.outputs is None else self.outputs[key], None if self.weights is None else self.weights[key], None if self.strata is None else self.strata[key])
+        return {"input": self.input_dict(self.inputs[key]), "output": None if self.outputs is None else self.output_dict(self.outputs[key])}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def shard_bounds(self, n, begin = 0, end = None):
+        bounds = np.linspace(begin, len(self) if end is None else end, n + 1).astype(int).tolist()
+        return [(b, e) for b, e in zip(bounds[:-1], bounds[1:]) if e > b]
+
+    def permute(self):
+        order = np.random.permutation(len(self))
+        return SampleSet(self.pi_names, self.po_names, self.inputs[order], None if self.outputs is None else self.outputs[order], None if self.weights is None else self.weights[order], None if self.strata is None else self.strata[order])
+
+    def shard(self, n):
+        return [self[begin:end] for begin, end in self.shard_bounds(n)]
+
+    def input_dict(self, row):
+        return dict(zip(self.pi_names, unpack(row[None, :], len(self.pi_names))[0].tolist()))
+
+    def output_dict(self, row):
+        return dict(zip(self.po_names, unpack(row[None, :], len(self.po_names))[0].tolist()))
+
+    def input_bits(self):
+        return unpack(self.inputs, len(self.pi_names))
+
+    def output_bits(self):
+        return unpack(self.outputs, len(self.po_names))
+
+    def input_column(self, name):
+        i = self.pi_index[name]
+        return (self.inputs[:, i // 8] >> (i % 8)) & 1 == 1
+
+    def output_column(self, name):
+        i = self.po_index[name]
+        return (self.outputs[:, i // 8] >> (i % 8)) & 1 == 1
+
+    def input_values(self, weights):
+        """
+        Weighted sum of (a subset of) the primary inputs, i.e., the vectorized counterpart of bool_to_value
+        """
+        names = list(weights.keys())
+        return np.stack([self.input_column(n) for n in names], axis = 1) @ weight_vector(names, weights)
+
+    def output_values(self, weights):
+        return self.output_bits() @ weight_vector(self.po_names, weights)
+
+    def weighted(self, values):
+        return values if self.weights is None else values * self.weights.reshape((-1,) + (1,) * (np.ndim(values) - 1))
+
+    def mean(self, values, axis = None):
+        return np.mean(self.weighted(values), axis = axis)
+
+    def kish_size(self):
+        return len(self) if self.weights is None else float(np.sum(self.weights) ** 2 / np.sum(self.weights ** 2))
+
+    def effective_size(self, values = None):
+        """
+        Number of uniformly drawn samples that would estimate the mean of values with the same variance as these ones,
+        i.e., the population variance over the (estimated) variance of the weighted, possibly stratified, mean. It falls
+        back to the Kish effective size if values are not given or the latter variance vanishes, and it is capped to the
+        number of distinct input vectors.
+        """
+        if values is None or len(self) < 2:
+            return self.kish_size()
+        values = np.asarray(values, dtype = float)
+        z = self.weighted(values)
+        if self.strata is None:
+            variance = np.var(z, ddof = 1) / len(z)
+        else:
+            variance = sum((np.count_nonzero(self.strata == h) / len(z)) ** 2 * np.var(z[self.strata == h], ddof = 1) / np.count_nonzero(self.strata == h) for h in np.unique(self.strata) if np.count_nonzero(self.strata == h) > 1)
+        population_variance = max(0.0, float(self.mean(values ** 2) - self.mean(values) ** 2))
+        if variance <= 0 or population_variance <= 0:
+            return self.kish_size()
+        return float(min(population_variance / variance, 2 ** len(self.pi_names)))
+
+
+class OutputSet:
+    """
+    Approximate outputs computed for a SampleSet, again as rows of bit-packed bytes. Iterating over an OutputSet yields
+    the {"i": inputs, "e": exact outputs, "a": approximate outputs} dicts formerly returned by MOP.get_outputs.
+    """
+    def __init__(self, samples, approx):
+        self.samples = samples
+        self.approx = approx
+
+    @staticmethod
+    def concatenate(samples, outputs):
+        return OutputSet(samples, np.concatenate([o for o in outputs if len(o)], axis = 0))
+
+    def __len__(self):
+        return len(self.approx)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return OutputSet(self.samples[key], self.approx[key])
+        sample = self.samples[key]
+        return {"i": sample["input"], "e": sample["output"], "a": self.samples.output_dict(self.approx[key])}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def exact_bits(self):
+        return self.samples.output_bits()
+
+    def approx_bits(self):
+        return unpack(self.approx, len(self.samples.po_names))
+
+    def error_mask(self):
+        return np.any(self.samples.outputs != self.approx, axis = 1)
+
+    def bit_errors(self):
+        return self.exact_bits() != self.approx_bits()
+
+    def input_values(self, weights):
+        return self.samples.input_values(weights)
+
+    def exact_values(self, weights):
+        return self.samples.output_values(weights)
+
+    def approx_values(self, weights):
+        return self.approx_bits() @ weight_vector(self.samples.po_names, weights)
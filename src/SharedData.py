@@ -0,0 +1,283 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import numpy as np, pickle, weakref, threading, collections, time
+from multiprocessing import Pool, shared_memory
+from .SampleSet import *
+from .CompactCatalog import *
+
+def call(function_and_args):
+    function, args = function_and_args
+    return function(*args)
+
+class SharedArray:
+    """
+    Picklable handle to a numpy array living in a shared-memory block. Processes attach to the block by name the first
+    time they need it, and keep the attached view, so handing the handle to a pool task costs a few bytes.
+    """
+    _attached = {}
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = dtype
+
+    @staticmethod
+    def create(array):
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create = True, size = max(1, array.nbytes))
+        view = np.ndarray(array.shape, dtype = array.dtype, buffer = shm.buf)
+        view[...] = array
+        SharedArray._attached[shm.name] = (shm, view)
+        return shm, SharedArray(shm.name, array.shape, array.dtype.str)
+
+    def get(self):
+        if self.name not in SharedArray._attached:
+            shm = shared_memory.SharedMemory(name = self.name)
+            SharedArray._attached[self.name] = (shm, np.ndarray(self.shape, dtype = self.dtype, buffer = shm.buf))
+        return SharedArray._attached[self.name][1]
+
+    def detach(self):
+        shm, _ = SharedArray._attached.pop(self.name, (None, None))
+        if shm is not None:
+            try:
+                shm.close()
+            except BufferError:
+                pass # some views are still alive, the mapping goes away with them
+
+    @staticmethod
+    def release(shm):
+        SharedArray._attached.pop(shm.name, None)
+        try:
+            shm.close()
+        except BufferError:
+            pass # some views are still alive, the mapping goes away with them
+        shm.unlink()
+
+
+class SharedObject:
+    """
+    Any picklable object, stored once in shared memory and unpickled at most once per process.
+    """
+    _objects = {}
+
+    def __init__(self, blob):
+        self.blob = blob
+
+    @staticmethod
+    def create(obj):
+        shm, blob = SharedArray.create(np.frombuffer(pickle.dumps(obj, protocol = pickle.HIGHEST_PROTOCOL), dtype = np.uint8))
+        return shm, SharedObject(blob)
+
+    def get(self):
+        if self.blob.name not in SharedObject._objects:
+            SharedObject._objects[self.blob.name] = pickle.loads(self.blob.get().tobytes())
+        return SharedObject._objects[self.blob.name]
+
+
+class SharedSamples:
+    """
+    Handle to a SampleSet whose bit-packed inputs and reference outputs (and estimator weights and strata, if any) live
+    in shared memory.
+    """
+    def __init__(self, pi_names, po_names, inputs, outputs, weights = None, strata = None):
+        self.pi_names = pi_names
+        self.po_names = po_names
+        self.inputs = inputs
+        self.outputs = outputs
+        self.weights = weights
+        self.strata = strata
+
+    @staticmethod
+    def create(samples):
+        shms, handles = [], []
+        for array in [samples.inputs, samples.outputs, samples.weights, samples.strata]:
+            shm, handle = SharedArray.create(array) if array is not None else (None, None)
+            shms += [shm] if shm is not None else []
+            handles.append(handle)
+        return shms, SharedSamples(samples.pi_names, samples.po_names, *handles)
+
+    def get(self):
+        return SampleSet(self.pi_names, self.po_names, self.inputs.get(), self.outputs.get(), None if self.weights is None else self.weights.get(), None if self.strata is None else self.strata.get())
+
+
+class SharedCatalog:
+    """
+    Handle to a CompactCatalog whose columns live in shared memory. Workers attach them as read-only views, and only
+    rebuild the specification index. Each process keeps the last catalog it got, and detaches the previous one, so
+    that blocks of catalogs no longer in use can be freed.
+    """
+    _catalog = None
+
+    def __init__(self, columns, version = None):
+        self.columns = columns
+        self.version = version
+
+    @staticmethod
+    def create(catalog):
+        shms, columns = [], {}
+        for name in CompactCatalog.columns:
+            shm, columns[name] = SharedArray.create(getattr(catalog, name))
+            shms.append(shm)
+        return shms, SharedCatalog(columns, catalog.version)
+
+    def get(self):
+        if SharedCatalog._catalog is None or SharedCatalog._catalog[0].columns["offsets"].name != self.columns["offsets"].name:
+            if SharedCatalog._catalog is not None:
+                previous = SharedCatalog._catalog[0]
+                SharedCatalog._catalog = None
+                for handle in previous.columns.values():
+                    handle.detach()
+            SharedCatalog._catalog = self, CompactCatalog.from_columns({name: handle.get() for name, handle in self.columns.items()}, self.version)
+        return SharedCatalog._catalog[1]
+
+
+class WorkerPool:
+    """
+    A persistent pool of worker processes, together with the shared-memory blocks its tasks refer to. Workers are
+    started on the first map, and both workers and blocks are released on close(), on garbage collection, or at exit.
+    """
+    def __init__(self, ncpus):
+        self.ncpus = ncpus
+        self.resources = {"pool": None, "shms": []}
+        self.finalizer = weakref.finalize(self, WorkerPool.release, self.resources)
+
+    def share(self, obj):
+        if isinstance(obj, SampleSet):
+            shms, handle = SharedSamples.create(obj)
+        elif isinstance(obj, CompactCatalog):
+            shms, handle = SharedCatalog.create(obj)
+        elif isinstance(obj, np.ndarray):
+            shm, handle = SharedArray.create(obj)
+            shms = [shm]
+        else:
+            shm, handle = SharedObject.create(obj)
+            shms = [shm]
+        self.resources["shms"] += shms
+        return handle
+
+    def get_pool(self):
+        if self.resources["pool"] is None:
+            self.resources["pool"] = Pool(self.ncpus)
+        return self.resources["pool"]
+
+    def starmap(self, function, args):
+        return self.get_pool().starmap(function, args)
+
+    def imap(self, function, args):
+        return self.get_pool().imap(call, [(function, a) for a in args])
+
+    def close(self):
+        self.finalizer()
+
+    @staticmethod
+    def release(resources):
+        if resources["pool"] is not None:
+            resources["pool"].terminate()
+            resources["pool"].join()
+            resources["pool"] = None
+        for shm in resources["shms"]:
+            SharedArray.release(shm)
+        resources["shms"].clear()
+
+
+def timed(function, args):
+    start = time.process_time()
+    result = function(*args)
+    return result, time.process_time() - start
+
+class FairWorkerPool:
+    """
+    A WorkerPool shared by several clients, e.g., the problems of several designs being optimized at once. Tasks of each
+    client are queued separately, and whenever a worker is free the next task is taken from the client that used the
+    least CPU time so far, so that clients issuing many or long tasks do not starve the others. Clients (see client())
+    provide share(), starmap(), imap() and ncpus, so they can be set as the workers of a problem.
+    """
+    class Client:
+        def __init__(self, pool, name):
+            self.pool = pool
+            self.name = name
+            self.ncpus = pool.ncpus
+            self.tasks = 0
+
+        @property
+        def usage(self):
+            return self.pool.usage[self.name]
+
+        def share(self, obj):
+            return self.pool.workers.share(obj)
+
+        def starmap(self, function, args):
+            return self.pool.submit(self, function, args)
+
+        def imap(self, function, args):
+            return iter(self.pool.submit(self, function, args))
+
+    def __init__(self, ncpus):
+        self.ncpus = ncpus
+        self.workers = WorkerPool(ncpus)
+        self.queues = {}
+        self.usage = {}
+        self.running = 0
+        self.cv = threading.Condition()
+
+    def client(self, name):
+        with self.cv:
+            assert name not in self.queues, f"{name}: duplicated client"
+            self.queues[name] = collections.deque()
+            # late clients start from the least usage so far, rather than from zero
+            self.usage[name] = min(self.usage.values(), default = 0)
+        return FairWorkerPool.Client(self, name)
+
+    def submit(self, client, function, args):
+        batch = {"results": [None] * len(args), "left": len(args), "error": None}
+        with self.cv:
+            self.queues[client.name].extend((batch, i, function, a) for i, a in enumerate(args))
+            self.dispatch()
+            while batch["left"]:
+                self.cv.wait()
+        if batch["error"] is not None:
+            raise batch["error"]
+        client.tasks += len(args)
+        return batch["results"]
+
+    def dispatch(self):
+        # called holding self.cv
+        while self.running < self.ncpus and (names := [n for n, q in self.queues.items() if q]):
+            name = min(names, key = self.usage.get)
+            batch, i, function, args = self.queues[name].popleft()
+            self.running += 1
+            self.workers.get_pool().apply_async(timed, (function, args), callback = lambda result, name = name, batch = batch, i = i: self.done(name, batch, i, *result), error_callback = lambda error, batch = batch: self.failed(batch, error))
+
+    def done(self, name, batch, i, result, usage):
+        with self.cv:
+            self.running -= 1
+            self.usage[name] += usage
+            batch["results"][i] = result
+            batch["left"] -= 1
+            self.dispatch()
+            self.cv.notify_all()
+
+    def failed(self, batch, error):
+        with self.cv:
+            self.running -= 1
+            batch["error"] = error
+            batch["left"] -= 1
+            self.dispatch()
+            self.cv.notify_all()
+
+    def close(self):
+        self.workers.close()
@@ -0,0 +1,132 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import numpy as np, weakref, collections
+from pyalslib import ALSGraph
+from .SampleSet import *
+
+class Simulator:
+    """
+    Evaluates an ALSGraph on a whole set of samples at once. The signal of each node is a boolean array, with one
+    element per sample; the fan-in signals of a LUT are combined into the index of the input pattern, which selects
+    the output from the (approximate) specification and is counted by np.bincount, giving the input-pattern frequencies
+    used for switching estimation. The same lut_io_info of ALSGraph.evaluate() is returned, frequencies being arrays.
+
+    Signals and histograms of the last configuration simulated on a given range of samples are kept (within max_bytes),
+    so that LUTs whose fan-in cone is unchanged are not simulated again, and their histograms are reused.
+    """
+    _simulators = weakref.WeakKeyDictionary()
+    max_bytes = 2**28
+
+    def __init__(self, graph):
+        vertices = graph.get_po()[0].graph.vs
+        self.pi = {v.index: v["name"] for v in graph.get_pi()}
+        self.constants = {v.index: v["type"] == ALSGraph.VertexType.CONSTANT_ONE for v in vertices if v["type"] in (ALSGraph.VertexType.CONSTANT_ZERO, ALSGraph.VertexType.CONSTANT_ONE)}
+        self.po = [(v["name"], v["in"][0]) for v in graph.get_po()]
+        # cells are sorted as ALSGraph.evaluate() visits them, i.e., depth-first from primary outputs
+        self.cells = []
+        visited = set(self.pi) | set(self.constants)
+        for _, driver in self.po:
+            stack = [driver]
+            while stack:
+                v = stack[-1]
+                if v in visited:
+                    stack.pop()
+                elif pending := [n for n in vertices[v]["in"] if n not in visited]:
+                    stack += reversed(pending)
+                else:
+                    stack.pop()
+                    visited.add(v)
+                    self.cells.append((v, vertices[v]["name"], list(vertices[v]["in"]), vertices[v]["spec"]))
+        self.states = collections.OrderedDict()
+
+    @staticmethod
+    def of(graph):
+        if graph not in Simulator._simulators:
+            Simulator._simulators[graph] = Simulator(graph)
+        return Simulator._simulators[graph]
+
+    @staticmethod
+    def size(state):
+        return sum(a.nbytes for a in state["values"].values()) + sum(a.nbytes for a in state["indexes"].values())
+
+    @staticmethod
+    def truth_table(spec):
+        return np.frombuffer(spec.encode(), dtype = np.uint8) == ord("1")
+
+    def evaluate(self, samples, configuration = None, key = None):
+        """
+        Returns the bit-packed outputs of the circuit for each of the samples, and the lut_io_info. If key is given
+        (e.g., the range of samples), the simulation of the previous configuration with the same key is reused.
+        """
+        n = len(samples)
+        inputs = samples.input_bits()
+        state = self.states.pop(key, None) if key is not None else None
+        if state is None or state["n"] != n:
+            state = {"n": n, "specs": {}, "indexes": {}, "values": {v: inputs[:, samples.pi_index[name]] for v, name in self.pi.items()} | {v: np.full(n, c) for v, c in self.constants.items()}, "freqs": {}}
+        values, specs, indexes, freqs = state["values"], state["specs"], state["indexes"], state["freqs"]
+        changed = set()
+        lut_io_info = {}
+        for v, name, fanin, spec in self.cells:
+            if configuration is not None and name in ("Constant 0", "Constant 1"):
+                if specs.get(v) != name:
+                    values[v] = np.full(n, name == "Constant 1")
+                    specs[v] = name
+                    changed.add(v)
+                continue
+            axspec = spec if configuration is None else configuration[name]["axspec"]
+            if v not in indexes or any(f in changed for f in fanin):
+                index = np.zeros(n, dtype = np.intp)
+                for i, f in enumerate(fanin):
+                    index |= values[f].astype(np.intp) << i
+                indexes[v] = index.astype(np.uint8 if len(spec) <= 256 else np.uint16)
+                freqs[v] = np.bincount(index, minlength = len(spec))
+                specs[v] = None
+            if specs[v] != axspec:
+                values[v] = Simulator.truth_table(axspec)[indexes[v]]
+                specs[v] = axspec
+                changed.add(v)
+            lut_io_info[name] = {"spec": axspec, "freq": freqs[v]}
+        outputs = pack(np.stack([values[driver] for _, driver in self.po], axis = 1)) if n else np.zeros((0, (len(self.po) + 7) // 8), dtype = np.uint8)
+        if key is not None and Simulator.size(state) <= self.max_bytes:
+            self.states[key] = state
+            while sum(Simulator.size(s) for s in self.states.values()) > self.max_bytes:
+                self.states.popitem(last = False)
+        return outputs, lut_io_info
+
+    def patterns(self, samples):
+        """
+        Returns, for each LUT (by name), the index of its input pattern for each of the samples, for the exact circuit.
+        """
+        inputs = samples.input_bits()
+        values = {v: inputs[:, samples.pi_index[name]] for v, name in self.pi.items()} | {v: np.full(len(samples), c) for v, c in self.constants.items()}
+        patterns = {}
+        for v, name, fanin, spec in self.cells:
+            index = np.zeros(len(samples), dtype = np.intp)
+            for i, f in enumerate(fanin):
+                index |= values[f].astype(np.intp) << i
+            values[v] = Simulator.truth_table(spec)[index]
+            patterns[name] = index
+        return patterns
+
+    def support(self):
+        """
+        Returns, for each LUT (by name), the set of primary inputs in its fan-in cone.
+        """
+        support = {v: {name} for v, name in self.pi.items()} | {v: set() for v in self.constants}
+        for v, _, fanin, _ in self.cells:
+            support[v] = set().union(*[support[f] for f in fanin])
+        return {name: support[v] for v, name, _, _ in self.cells}
@@ -0,0 +1,107 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import random, threading
+from multiprocessing import Pool
+from pyalslib import ALSCatalogCache, do_synthesis, hamming
+
+def synthesize_entry(lut_spec, dist, solver, timeout):
+    synt_spec, S, P, out_p, out, depth = do_synthesis(lut_spec, dist, solver, timeout)
+    return {"spec": synt_spec, "gates": len(S[0]), "S": S, "P": P, "out_p": out_p, "out": out, "depth": depth}
+
+class StreamingCatalog(list):
+    """
+    Catalog (one list of entries per LUT specification, as returned by ALSCatalog.generate_catalog) whose approximate
+    entries are synthesized by a background pool of workers, and appended to the entries of their LUT as soon as they
+    are available, so that the design space exploration can start as soon as every LUT has its exact implementation.
+    Each LUT is synthesized at increasing distances, as ALSCatalog does, until no gates are left; entries are stored to
+    the catalog cache as they arrive, and the synthesis of LUTs found in the cache resumes from the last cached distance.
+
+    version counts the entries added so far, so that users (see MOP.widen()) can tell the catalog has grown.
+    """
+    def __init__(self, cache_file, solver, luts_set, timeout, ncpus):
+        super().__init__()
+        self.cache = ALSCatalogCache(cache_file)
+        self.cache.init()
+        self.solver = solver
+        self.timeout = timeout
+        self.version = 0
+        self.pending = 0
+        self.cv = threading.Condition()
+        self.pool = Pool(ncpus)
+        luts_set = list(luts_set)
+        random.shuffle(luts_set)
+        with self.cv:
+            for lut_spec in luts_set:
+                entries = []
+                self.append(entries)
+                if (exact := self.cache.get_exact_lut(lut_spec)) is None:
+                    print(f"Cache miss for {lut_spec}")
+                    self.synthesize(lut_spec, entries, 0, 10000)
+                    continue
+                entries += [StreamingCatalog.entry(*exact)] + [StreamingCatalog.entry(*lut) for lut in self.cache.get_approx_luts(lut_spec)]
+                if len(entries) > 1:
+                    self.synthesize(lut_spec, entries, hamming(entries[0]["spec"], entries[-1]["spec"]) + 1, entries[-1]["gates"])
+            # exact implementations are needed right away
+            while self.pending and any(len(entries) == 0 for entries in self):
+                self.cv.wait()
+        assert all(len(entries) > 0 for entries in self), "Exact synthesis failed for some LUTs"
+
+    def __reduce__(self):
+        return (list, ([list(entries) for entries in self],))
+
+    @staticmethod
+    def entry(synt_spec, S, P, out_p, out, depth):
+        return {"spec": synt_spec, "gates": len(S[0]), "S": S, "P": P, "out_p": out_p, "out": out, "depth": depth}
+
+    def synthesize(self, lut_spec, entries, dist, gates):
+        if gates > 0:
+            self.pending += 1
+            self.pool.apply_async(synthesize_entry, (lut_spec, dist, self.solver, self.timeout), callback = lambda entry: self.add(lut_spec, entries, dist, gates, entry), error_callback = lambda error: self.fail(lut_spec, dist, error))
+
+    def add(self, lut_spec, entries, dist, gates, entry):
+        print(f"{lut_spec}@{dist} synthesized as {entry['spec']} using {entry['gates']} gates at depth {entry['depth']}.")
+        with self.cv:
+            self.pending -= 1
+            if entry["gates"] < gates:
+                self.cache.add_lut(lut_spec, dist, entry["spec"], entry["S"], entry["P"], entry["out_p"], entry["out"], entry["depth"])
+                entries.append(entry)
+                self.version += 1
+            self.synthesize(lut_spec, entries, dist + 1, entry["gates"])
+            self.cv.notify_all()
+
+    def fail(self, lut_spec, dist, error):
+        print(f"Synthesis of {lut_spec}@{dist} failed: {error}")
+        with self.cv:
+            self.pending -= 1
+            self.cv.notify_all()
+
+    def complete(self):
+        return self.pending == 0
+
+    def wait(self):
+        """
+        Waits for the whole catalog to be synthesized, and releases the workers.
+        """
+        with self.cv:
+            while self.pending:
+                self.cv.wait()
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -0,0 +1,109 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import numpy as np, warnings, collections
+from sklearn.ensemble import RandomForestRegressor
+
+class Surrogate:
+    """
+    Random-forest model of the error metrics as a function of the configuration, trained online on the configurations
+    that are simulated. The spread of the predictions of the single trees is used as uncertainty: a candidate is
+    rejected without simulation only if its predicted error exceeds a threshold by more than z standard deviations,
+    i.e., candidates near the feasibility boundary, as well as the ones that may enter the archive, are always simulated.
+    The model is trained on the last max_samples simulated candidates only, which are the closest to the region being
+    explored, so that the cost of each refit does not grow with the length of the run.
+    """
+    def __init__(self, thresholds, min_samples = 200, refit_every = 100, z = 3.0, n_estimators = 32, max_samples = 5000):
+        self.thresholds = np.array(thresholds, dtype = float)
+        self.min_samples = min_samples
+        self.refit_every = refit_every
+        self.z = z
+        self.n_estimators = n_estimators
+        self.X = collections.deque(maxlen = max_samples)
+        self.Y = collections.deque(maxlen = max_samples)
+        self.model = None
+        self.since_fit = 0
+        self.saved = 0
+        self.checked = 0
+        self.correct = 0
+        self.abs_error = np.zeros(len(self.thresholds))
+
+    def add(self, x, errors):
+        errors = np.array(errors, dtype = float)
+        if self.model is not None:
+            # accuracy is measured on simulated candidates, before learning from them
+            mean, _ = self.predict([x])
+            mean = mean[0]
+            self.checked += 1
+            self.correct += int(np.all(mean <= self.thresholds) == np.all(errors <= self.thresholds))
+            self.abs_error += np.abs(mean - errors)
+        self.X.append(list(x))
+        self.Y.append(errors)
+        self.since_fit += 1
+        if len(self.X) >= self.min_samples and (self.model is None or self.since_fit >= self.refit_every):
+            self.fit()
+
+    def fit(self):
+        Y = np.array(self.Y)
+        self.model = RandomForestRegressor(n_estimators = self.n_estimators, min_samples_leaf = 2)
+        with warnings.catch_warnings():
+            # pyamosa turns warnings into errors
+            warnings.simplefilter("ignore")
+            self.model.fit(np.array(self.X), Y if Y.shape[1] > 1 else Y.ravel())
+        # the trees are stacked into arrays padded to the largest one, so that all of them are walked at once
+        trees = [estimator.tree_ for estimator in self.model.estimators_]
+        size = max(tree.node_count for tree in trees)
+        pad = lambda array, fill: np.stack([np.concatenate([a, np.full((size - len(a),) + a.shape[1:], fill, dtype = a.dtype)]) for a in array])
+        self.left = pad([tree.children_left for tree in trees], -1)
+        self.right = pad([tree.children_right for tree in trees], -1)
+        self.feature = np.maximum(pad([tree.feature for tree in trees], 0), 0)
+        self.threshold = pad([tree.threshold for tree in trees], 0)
+        self.value = pad([tree.value[:, :, 0] for tree in trees], 0)
+        self.depth = max(tree.max_depth for tree in trees)
+        self.since_fit = 0
+
+    def predict(self, X):
+        """
+        Returns mean and standard deviation, over the trees, of the predicted errors of each configuration in X. All the
+        trees are walked at once, one level per step, for all the configurations.
+        """
+        # trees split on float32 features, as RandomForestRegressor.predict() does
+        X = np.array(X, dtype = np.float32).astype(float)
+        trees, candidates = np.arange(len(self.left))[:, None], np.arange(len(X))[None, :]
+        nodes = np.zeros((len(self.left), len(X)), dtype = int)
+        for _ in range(self.depth):
+            left = X[candidates, self.feature[trees, nodes]] <= self.threshold[trees, nodes]
+            nodes = np.where(self.left[trees, nodes] < 0, nodes, np.where(left, self.left[trees, nodes], self.right[trees, nodes]))
+        predictions = self.value[trees, nodes]
+        return np.mean(predictions, axis = 0), np.std(predictions, axis = 0)
+
+    def screen(self, x):
+        """
+        Returns the predicted errors of x if it is unfeasible beyond any reasonable doubt, None otherwise.
+        """
+        if self.model is None:
+            return None
+        mean, std = self.predict([x])
+        mean, std = mean[0], std[0]
+        if np.any(mean - self.z * std > self.thresholds):
+            self.saved += 1
+            return mean.tolist()
+        return None
+
+    def report(self):
+        if self.checked == 0:
+            return f"Surrogate model: {len(self.X)} training samples, {self.saved} simulations saved"
+        return f"Surrogate model: {len(self.X)} training samples, {self.saved} simulations saved. Feasibility accuracy: {self.correct / self.checked * 100:.2f}% over {self.checked} simulated candidates, mean absolute error: {(self.abs_error / self.checked).tolist()}"
@@ -14,63 +14,81 @@ You should have received a copy of the GNU General Public License along with
 RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
 Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
-import os, random
+import os, numpy as np
 from .template_render import template_render
 
 class TbGenerator:
     __resource_dir = "../resources/"
     __tb_v = "tb.v.template"
+    __hex_digits = np.frombuffer(b"0123456789abcdef", dtype = np.uint8)
     
-    def __init__(self, helper, problem, delay, design_name = "original"):
+    def __init__(self, helper, delay, design_name = "original"):
         dir_path = os.path.dirname(os.path.abspath(__file__))
         self.resource_dir =  f"{dir_path}/{self.__resource_dir}"
         self.helper = helper
         self.helper.reset()
         self.helper.delete()
-        self.problem = problem
         self.delay = delay
         self.design_name = design_name
         self.helper.load_design(self.design_name)
         self.helper.reverse_splitnets()
         self.wires = helper.get_PIs_and_Pos()
         
-    def generate(self, outfile, nvec = None):
-        stims = self.get_stims()
-        for pi, stim in stims.items():
-            random.shuffle(stim["stims"])
-            if nvec is not None:
-                stim["stims"] = random.choices(stim["stims"], k = nvec)
+    def generate(self, outfile, nvec = None, fmt = "hex", seed = None):
+        """
+        Renders the testbench to outfile, and writes stimuli to a $readmemh/$readmemb-compatible data file (one vector
+        per line) which the testbench streams from, using $fscanf.
+        """
+        assert fmt in ("hex", "bin"), f"{fmt}: unsupported stimuli format"
+        pis = self.get_pi()
+        width = sum(pi["width"] for pi in pis)
+        stims = self.get_stims(width, nvec, seed)
+        stimuli_file = f"{os.path.splitext(outfile)[0]}_stimuli.mem"
+        self.write_stims(stimuli_file, stims, width, fmt)
         items = {
             "top_module"   : self.helper.top_module,
-            "pi"           : list(stims.keys()),
+            "pi"           : pis,
             "po"           : self.get_po(),
-            "stimuli"      : stims,
+            "width"        : width,
+            "nvec"         : len(stims),
+            "stimuli_file" : os.path.basename(stimuli_file),
+            "format"       : "h" if fmt == "hex" else "b",
             "initialdelay" : 2*self.delay,
             "delay"        : self.delay,
         }
         template_render(self.resource_dir, self.__tb_v, items, outfile)
         
+    def get_pi(self):
+        return [ {"name": name.str()[1:], "width": wire.width} for name, wire in self.wires["PI"].items() ]
+
     def get_po(self):
         return [ {"name": name.str()[1:], "width": wire.width} for name, wire in self.wires["PO"].items() ]
     
-    def get_stims(self):
-        stims = {}
-        for name, wire in self.wires["PI"].items():
-            stims[name.str()[1:]] = {   
-                        "width": wire.width, 
-                        "zero": f"{wire.width}'b" + "0" * wire.width}
-            if wire.width > 1:
-                stims[name.str()[1:]]["stims"] = list(
-                    dict.fromkeys( 
-                        f"{wire.width}'b" + "".join(reversed([ "1" if s["input"][f"{name.str()}[{i}]"] else "0" 
-                            for i in reversed(range(wire.width)) ])) 
-                                for s in self.problem.samples ))
-            elif wire.width == 1:
-                stims[name.str()[1:]]["stims"] = list(
-                    f"{wire.width}'b" + ("1" if s["input"][f"{name.str()}"] else "0")
-                                for s in self.problem.samples )
-                
-        # for name in self.wires["PI"].keys():
-        #     print(name.str()[1:], stims[name.str()[1:]]["stims"])
-        # exit()
-        return stims
\ No newline at end of file
+    @staticmethod
+    def get_stims(width, nvec = None, seed = None):
+        """
+        Returns stimuli as a (nvec, ceil(width / 64)) array of little-endian 64-bit words, each row being the
+        concatenation of all the primary inputs. Drawing every bit uniformly is the same as drawing each primary input
+        uniformly, with repetition. If nvec is None, stimuli are exhaustive, in random order.
+        """
+        nwords = (width + 63) // 64
+        rng = np.random.default_rng(seed)
+        if nvec is None:
+            assert width <= 24, f"Exhaustive testbench for {width} primary inputs is not feasible. Please, specify the number of test vectors."
+            return rng.permutation(np.arange(2 ** width, dtype = np.uint64)).reshape(-1, 1)
+        stims = rng.integers(0, np.iinfo(np.uint64).max, size = (nvec, nwords), dtype = np.uint64, endpoint = True)
+        if width % 64:
+            stims[:, -1] &= np.uint64((1 << (width % 64)) - 1)
+        return stims
+
+    @staticmethod
+    def write_stims(stimuli_file, stims, width, fmt = "hex"):
+        # big-endian bytes of each vector, the most significant one first
+        data = np.ascontiguousarray(stims[:, ::-1].astype(">u8")).view(np.uint8)
+        if fmt == "hex":
+            digits = (width + 3) // 4
+            chars = TbGenerator.__hex_digits[np.stack([data >> 4, data & 0xf], axis = 2).reshape(len(data), -1)[:, -digits:]]
+        else:
+            chars = np.unpackbits(data, axis = 1)[:, -width:] + ord("0")
+        with open(stimuli_file, "wb") as f:
+            f.write(np.hstack([chars, np.full((len(chars), 1), ord("\n"), dtype = np.uint8)]).tobytes())
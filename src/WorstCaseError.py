@@ -0,0 +1,167 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import z3, threading
+from fractions import Fraction
+from .Simulator import *
+
+class WorstCaseError:
+    """
+    Exact AWCE and WRE of approximate configurations, computed by SMT rather than by simulation. A miter compares the
+    exact circuit and the approximate one, LUTs being encoded from their truth tables as if-then-else trees over their
+    fan-in; signals of the approximate circuit whose LUT and fan-in are unchanged are the exact ones, so that only the
+    approximate cones are duplicated. The worst-case error is then the maximum of the weighted output difference, found
+    by binary search on its magnitude: each satisfiable query raises the lower bound to the error of its model, each
+    unsatisfiable one lowers the upper bound.
+
+    Output weights are scaled by a power of two so that output values are integers, and bit-vectors are wide enough for
+    differences not to overflow. Results are cached by the set of approximate LUTs.
+    """
+    def __init__(self, graph, output_weights, timeout = None):
+        assert output_weights is not None, "You must specify the weight of each output to compute the worst-case error formally!"
+        self.simulator = Simulator.of(graph)
+        self.scale = 1
+        while any(float(w) * self.scale != int(float(w) * self.scale) for w in output_weights.values()):
+            assert self.scale < 2**64, "Output weights must be dyadic rationals to compute the worst-case error formally!"
+            self.scale *= 2
+        self.weights = {o: int(float(w) * self.scale) for o, w in output_weights.items()}
+        self.width = sum(abs(w) for w in self.weights.values()).bit_length() + 2
+        self.timeout = timeout
+        self.cache = {}
+        self.exact = None
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k not in ("exact", "lock")} | {"exact": None}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def lut(spec, fanin):
+        if spec == "0" * len(spec):
+            return z3.BoolVal(False)
+        if spec == "1" * len(spec):
+            return z3.BoolVal(True)
+        # the last fan-in signal is the msb of the index of the input pattern
+        low, high = spec[:len(spec) // 2], spec[len(spec) // 2:]
+        if low == high:
+            return WorstCaseError.lut(low, fanin[:-1])
+        return z3.If(fanin[-1], WorstCaseError.lut(high, fanin[:-1]), WorstCaseError.lut(low, fanin[:-1]))
+
+    def exact_signals(self):
+        if self.exact is None:
+            signals = {v: z3.Bool(name) for v, name in self.simulator.pi.items()} | {v: z3.BoolVal(c) for v, c in self.simulator.constants.items()}
+            for v, _, fanin, spec in self.simulator.cells:
+                signals[v] = WorstCaseError.lut(spec, [signals[f] for f in fanin])
+            self.exact = signals
+        return self.exact
+
+    def miter(self, configuration):
+        """
+        Returns the weighted difference between exact and approximate outputs, the exact output value, and the maximum
+        magnitude of the difference, or None if no output can differ.
+        """
+        exact = self.exact_signals()
+        approx = dict(exact)
+        for v, name, fanin, spec in self.simulator.cells:
+            if name in ("Constant 0", "Constant 1"):
+                approx[v] = z3.BoolVal(name == "Constant 1")
+            elif configuration[name]["axspec"] != spec or any(approx[f] is not exact[f] for f in fanin):
+                approx[v] = WorstCaseError.lut(configuration[name]["axspec"], [approx[f] for f in fanin])
+        zero = z3.BitVecVal(0, self.width)
+        changed = [(o, d) for o, d in self.simulator.po if approx[d] is not exact[d] and self.weights.get(o, 0) != 0]
+        if not changed:
+            return None
+        difference = z3.Sum([z3.If(exact[d] == approx[d], zero, z3.If(exact[d], z3.BitVecVal(self.weights[o], self.width), z3.BitVecVal(-self.weights[o], self.width))) for o, d in changed])
+        value = z3.Sum([z3.If(exact[d], z3.BitVecVal(self.weights[o], self.width), zero) for o, d in self.simulator.po if self.weights.get(o, 0) != 0])
+        return difference, value, sum(abs(self.weights[o]) for o, _ in changed)
+
+    def solver(self):
+        solver = z3.SolverFor("QF_BV")
+        if self.timeout is not None:
+            solver.set("timeout", self.timeout)
+        return solver
+
+    def maximize(self, solver, above, value, lo, hi, midpoint):
+        # the maximum stays within [lo, hi]; above(mid) holds for models whose value exceeds mid
+        while lo < hi:
+            mid = max(lo, min(midpoint(lo, hi), hi))
+            solver.push()
+            solver.add(above(mid))
+            result = solver.check()
+            if result == z3.sat:
+                lo = max(lo, value(solver.model()))
+            solver.pop()
+            if result == z3.unsat:
+                hi = mid
+            elif result == z3.unknown:
+                print(f"Worst-case error search stopped ({solver.reason_unknown()}): using the lower bound {lo} (upper bound {hi})")
+                break
+        return lo
+
+    @staticmethod
+    def key(configuration):
+        return tuple(sorted((n, c["axspec"]) for n, c in configuration.items() if c["axspec"] != c["spec"]))
+
+    def awce(self, configuration, lower_bound = 0):
+        """
+        Returns the AWCE of configuration. lower_bound, if given, must be the error of some input vector, e.g., the
+        AWCE on a sample set.
+        """
+        key = ("awce",) + WorstCaseError.key(configuration)
+        if key not in self.cache:
+            with self.lock:
+                miter = self.miter(configuration)
+                if miter is None:
+                    self.cache[key] = 0.0
+                else:
+                    difference, _, hi = miter
+                    magnitude = z3.If(difference < 0, -difference, difference)
+                    solver = self.solver()
+                    lo = self.maximize(solver, lambda mid: z3.UGT(magnitude, mid), lambda model: model.eval(magnitude, model_completion = True).as_long(), int(round(lower_bound * self.scale)), hi, lambda lo, hi: (lo + hi) // 2)
+                    self.cache[key] = lo / self.scale
+        return self.cache[key]
+
+    def wre(self, configuration):
+        """
+        Returns the WRE of configuration, i.e., the maximum of |f - axf| / f, f being replaced by 1 where it is 0.
+        """
+        key = ("wre",) + WorstCaseError.key(configuration)
+        if key not in self.cache:
+            with self.lock:
+                miter = self.miter(configuration)
+                if miter is None:
+                    self.cache[key] = 0.0
+                else:
+                    difference, value, hi = miter
+                    # bisection points have numerators within 2 * self.width bits, and denominators within self.width bits
+                    width = 3 * self.width + 2
+                    magnitude = z3.SignExt(width - self.width, z3.If(difference < 0, -difference, difference))
+                    denominator = z3.SignExt(width - self.width, z3.If(value == 0, z3.BitVecVal(self.scale, self.width), value))
+                    ratio = lambda model: Fraction(model.eval(magnitude, model_completion = True).as_signed_long(), model.eval(denominator, model_completion = True).as_signed_long())
+                    def above(mid):
+                        p, q = z3.BitVecVal(mid.numerator, width), z3.BitVecVal(mid.denominator, width)
+                        return z3.Or(z3.And(denominator > 0, magnitude * q > p * denominator), z3.And(denominator < 0, magnitude * q < p * denominator))
+                    def midpoint(lo, hi):
+                        mid = ((lo + hi) / 2).limit_denominator(2 ** self.width)
+                        return lo if hi - lo <= Fraction(max(abs(hi), 1), 2 ** 20) else mid
+                    solver = self.solver()
+                    assert solver.check() == z3.sat
+                    lo = self.maximize(solver, above, ratio, ratio(solver.model()), Fraction(hi), midpoint)
+                    self.cache[key] = float(lo)
+        return self.cache[key]
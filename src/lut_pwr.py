@@ -125,8 +125,64 @@ def internal_node_activity(lut_conf, leaf_freq=None):
     of the leaves on the left-hand side and the right-hand of the 2k trees rooted at level k.
     """
     num_vars = math.ceil(math.log2(len(lut_conf)))
+    if leaf_freq is None:
+        leaf_freq = get_equiprob_inputs(num_vars)
     orig_vars = range(num_vars, 0, -1)
     perms = list(permutations(orig_vars))
     reord_power = [internal_node_activity_helper(reorder_conf(lut_conf, perm), reorder_freq(leaf_freq, perm)) for perm in perms]
     best_reord = argmin(reord_power)    
     return reord_power[best_reord], reorder_conf(lut_conf, perms[best_reord])
+
+
+def permutation_indexes(K):
+    """
+    Returns the permutations of the K selection inputs, as used by internal_node_activity, along with the
+    corresponding reordering indexes, i.e., reorder_conf(lut_conf, perms[p])[i] == lut_conf[indexes[p][i]].
+    :param K: the K for the lut, i.e., the number of selection inputs
+    :return: the list of permutations and a (K!, 2^K) array of reordering indexes
+    """
+    perms = list(permutations(range(K, 0, -1)))
+    indexes = np.array([[int(''.join(str(truth_value(j, i)) for j in perm), 2) for i in range(2 ** K)] for perm in perms], dtype = np.intp)
+    return perms, indexes
+
+
+def specs_to_array(specs):
+    """
+    Converts a list of lut configurations (as strings, lsb is lut_conf[0]) to a (n, 2^K) uint8 array
+    """
+    return (np.frombuffer("".join(specs).encode(), dtype = np.uint8).reshape(len(specs), -1) == ord('1')).astype(np.uint8)
+
+
+def internal_node_activity_helper_batch(truth_tables, leaf_freq = None):
+    """
+    Vectorized version of internal_node_activity_helper
+    :param truth_tables: (n, 2^K) array of lut configurations, lsb is column 0
+    :param leaf_freq: leaf frequencies, either (2^K) or (n, 2^K); equiprobable inputs if None
+    :return: (n) array of internal node activities
+    """
+    K = get_K(truth_tables[0])
+    below = np.broadcast_to(np.full(2 ** K, 1 / 2 ** K) if leaf_freq is None else np.asarray(leaf_freq, dtype = float), truth_tables.shape)
+    p_0 = 1.0 - truth_tables
+    activity = np.zeros(len(truth_tables))
+    for _ in range(K):
+        l = np.sum(below[:, 0::2], axis = 1, keepdims = True)
+        r = np.sum(below[:, 1::2], axis = 1, keepdims = True)
+        below = below[:, 0::2] + below[:, 1::2]
+        p_0 = l * p_0[:, 0::2] + r * p_0[:, 1::2]
+        activity += np.sum(p_0 - p_0 ** 2, axis = 1)
+    return activity
+
+
+def internal_node_activity_batch(truth_tables, leaf_freq = None):
+    """
+    Vectorized version of internal_node_activity, computing the minimum power reordering of many luts at once
+    :param truth_tables: (n, 2^K) array of lut configurations, lsb is column 0
+    :param leaf_freq: leaf frequencies, either (2^K) or (n, 2^K); equiprobable inputs if None
+    :return: (n) array of minimum internal node activities and (n) array of the indexes of the best permutation
+    """
+    truth_tables = np.atleast_2d(truth_tables)
+    _, indexes = permutation_indexes(get_K(truth_tables[0]))
+    leaf_freq = None if leaf_freq is None else np.broadcast_to(np.asarray(leaf_freq, dtype = float), truth_tables.shape)
+    reord_power = np.stack([internal_node_activity_helper_batch(truth_tables[:, idx], None if leaf_freq is None else leaf_freq[:, idx]) for idx in indexes], axis = 1)
+    best_reord = np.argmin(reord_power, axis = 1)
+    return reord_power[np.arange(len(truth_tables)), best_reord], best_reord
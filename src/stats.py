@@ -14,24 +14,58 @@ You should have received a copy of the GNU General Public License along with
 RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
 Street, Fifth Floor, Boston, MA 02110-1301, USA.
 """
+import sqlite3, numpy as np
+from multiprocessing import Pool, cpu_count
 from pyalslib import ALSCatalogCache
 from src.lut_pwr import *
+from tqdm import tqdm
 import matplotlib.pyplot as plt
 
 
+def load_exact_luts(catalog):
+	"""
+	Loads the exact luts of the catalog once, as columnar arrays
+	"""
+	luts = ALSCatalogCache(catalog).get_all_exact_luts()
+	return {
+		"spec"  : [s[0] for s in luts],
+		"gates" : np.array([len(s[1][0]) for s in luts], dtype = int),
+		"ones"  : np.array([s[0].count('1') for s in luts], dtype = int),
+		"depth" : np.array([s[5] for s in luts], dtype = int)}
+
+
+def compute_activity(specs):
+	return internal_node_activity_batch(specs_to_array(specs))[0]
+
+
+def switching_activity(catalog, specs, ncpus = cpu_count(), batch_size = 4096):
+	"""
+	Returns the (minimum power reordering) switching activity of the given specs, assuming equiprobable inputs.
+	Values are cached in the switching_activity table of the catalog, so that they are computed just once.
+	"""
+	connection = sqlite3.connect(catalog)
+	connection.execute("create table if not exists switching_activity (spec text primary key, activity real)")
+	cached = dict(connection.execute("select spec, activity from switching_activity"))
+	missing = [s for s in dict.fromkeys(specs) if s not in cached]
+	if missing:
+		# specs are grouped by length, as each batch is a single (n, 2^K) array
+		groups = [[s for s in missing if len(s) == k] for k in set(len(s) for s in missing)]
+		batches = [group[i : i + batch_size] for group in groups for i in range(0, len(group), batch_size)]
+		with Pool(ncpus) as pool:
+			for batch, activity in zip(batches, tqdm(pool.imap(compute_activity, batches), total = len(batches), desc = "Computing switching activity...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}")):
+				computed = list(zip(batch, activity.tolist()))
+				connection.executemany("insert or replace into switching_activity (spec, activity) values (?, ?)", computed)
+				cached.update(computed)
+		connection.commit()
+	connection.close()
+	return np.array([cached[s] for s in specs])
+
+
 def gates_histogram(catalog):
-	cache = ALSCatalogCache(catalog)
-	gates_per_luts = {}
-	for s in cache.get_all_exact_luts():
-		synth_spec, S, P, out_p, out, depth = s
-		ngates = len(S[0])
-		if ngates in gates_per_luts:
-			gates_per_luts[ngates] += 1
-		else:
-			gates_per_luts[ngates] = 1
+	luts = load_exact_luts(catalog)
+	gates_range, count = np.unique(luts["gates"], return_counts = True)
 	plt.figure(figsize=[8,4])
-	gates_range = sorted(gates_per_luts.keys())
-	plt.bar(gates_range, [gates_per_luts[i] for i in gates_range], width=0.5)
+	plt.bar(gates_range, count, width=0.5)
 	plt.xticks(gates_range)
 	plt.ylabel("Number of specifications")
 	plt.xlabel("#AIG nodes")
@@ -59,55 +93,70 @@ def get_data_from_boxplot(bp):
 	return medians, bounds, q1, q3, lower_outliers, upper_outliers
 
 
-def power_gates_boxplot(catalog):
-	cache = ALSCatalogCache(catalog)
-	power_per_gates = {}
-	for spec in cache.get_all_exact_luts():
-		exact_synth_spec, exact_S, exact_P, exact_out_p, exact_out, exact_depth = spec
-		exact_gates = len(exact_S[0])
-		exact_power, ex_reord = internal_node_activity(exact_synth_spec)
-		if exact_gates not in power_per_gates.keys():
-			power_per_gates[exact_gates] = []
-		power_per_gates[exact_gates].append(exact_power)
-	gates_range = sorted(power_per_gates.keys())
+def power_gates_boxplot(catalog, ncpus = cpu_count()):
+	luts = load_exact_luts(catalog)
+	power = switching_activity(catalog, luts["spec"], ncpus)
+	gates_range = np.unique(luts["gates"])[::-1]
 	plt.figure(figsize=[8,4])
-	data = [power_per_gates[i] for i in reversed(gates_range)]
-	plt.boxplot(data, labels=list(reversed(gates_range)))
+	data = [power[luts["gates"] == i] for i in gates_range]
+	plt.boxplot(data, labels=gates_range.tolist())
 	plt.ylabel("Switching activity")
 	plt.xlabel("#AIG nodes")
 	plt.savefig("switching_per_gates_boxplot.pdf", bbox_inches='tight', pad_inches=0)
 
 
-def power_truth_boxplot(catalog):
-	cache = ALSCatalogCache(catalog)
-	power_per_ones = {}
-	for spec in cache.get_all_exact_luts():
-		exact_synth_spec, exact_S, exact_P, exact_out_p, exact_out, exact_depth = spec
-		ones = exact_synth_spec.count('1')
-		exact_power, ex_reord = internal_node_activity(exact_synth_spec)
-		if ones not in power_per_ones.keys():
-			power_per_ones[ones] = []
-		power_per_ones[ones].append(exact_power)
-	ones_range = sorted(power_per_ones.keys())
+def power_truth_boxplot(catalog, ncpus = cpu_count()):
+	luts = load_exact_luts(catalog)
+	power = switching_activity(catalog, luts["spec"], ncpus)
+	ones_range = np.unique(luts["ones"])
 	plt.figure(figsize=[8,4])
-	data = [power_per_ones[i] for i in ones_range]
-	plt.boxplot(data, labels=ones_range)
+	data = [power[luts["ones"] == i] for i in ones_range]
+	plt.boxplot(data, labels=ones_range.tolist())
 	plt.ylabel("Switching activity")
 	plt.xlabel("Truth-density")
 	plt.savefig("switching_per_truth_boxplot.pdf", bbox_inches='tight', pad_inches=0)
 
 
-def power_truth_k_boxplot(k):
+def truth_k_histogram(k, first, last, bins):
+	"""
+	Histogram (truth-density x switching activity) of the k-input functions in [first, last), as enumerated by
+	power_truth_k_boxplot, i.e., spec[0] is the msb of the function index.
+	"""
+	functions = np.arange(first, last, dtype = np.uint64)
+	shifts = np.arange(2 ** k - 1, -1, -1, dtype = np.uint64)
+	truth_tables = ((functions[:, None] >> shifts) & np.uint64(1)).astype(np.uint8)
+	activity = internal_node_activity_batch(truth_tables)[0]
+	histogram, _, _ = np.histogram2d(truth_tables.sum(axis = 1), activity, bins = [2 ** k + 1, bins], range = [[-0.5, 2 ** k + 0.5], [0, (2 ** k - 1) / 4]])
+	return histogram.astype(np.int64)
+
+
+def boxplot_stats_from_histogram(counts, edges, label):
+	centers = (edges[:-1] + edges[1:]) / 2
+	cumulative = np.cumsum(counts) / np.sum(counts)
+	q1, med, q3 = centers[np.searchsorted(cumulative, [0.25, 0.5, 0.75])]
+	populated = centers[counts > 0]
+	whislo = populated[populated >= q1 - 1.5 * (q3 - q1)].min()
+	whishi = populated[populated <= q3 + 1.5 * (q3 - q1)].max()
+	# one flier per populated bin beyond the whiskers: fliers with the same value overlap anyway
+	fliers = populated[(populated < whislo) | (populated > whishi)]
+	return {"label": label, "q1": q1, "med": med, "q3": q3, "whislo": whislo, "whishi": whishi, "fliers": fliers}
+
+
+def power_truth_k_boxplot(k, ncpus = cpu_count(), chunk_size = 2 ** 16, bins = 10000):
 	relevant_truth = range(2, 2 ** k - 1)
-	powers = {i: [] for i in range(2 ** k + 1)}
-	for bool_f in range(2 ** ((2 ** k) - 1)):
-		print(f"  {bool_f + 1}/{2 ** ((2 ** k) - 1)} ({(bool_f + 1) * 100 // (2 ** ((2 ** k) - 1))}%)" + " " * 30,	end="\r", flush=True)
-		spec = '{bool_f:0' + str(2 ** k) + 'b}'
-		spec = spec.format(bool_f=bool_f)
-		ones = spec.count('1')
-		powers[ones].append(internal_node_activity(spec)[0])
-	fig = plt.figure(figsize=[8,4])
-	plt.boxplot([powers[i] for i in relevant_truth], labels=relevant_truth)
+	n_functions = 2 ** ((2 ** k) - 1)
+	args = [[k, first, min(first + chunk_size, n_functions), bins] for first in range(0, n_functions, chunk_size)]
+	histogram = np.zeros((2 ** k + 1, bins), dtype = np.int64)
+	with Pool(ncpus) as pool:
+		for h in tqdm(pool.imap_unordered(truth_k_histogram_star, args), total = len(args), desc = f"Enumerating {k}-input functions...", bar_format="{desc:40} {percentage:3.0f}% |{bar:60}{r_bar}{bar:-10b}"):
+			histogram += h
+	edges = np.linspace(0, (2 ** k - 1) / 4, bins + 1)
+	fig, ax = plt.subplots(figsize=[8,4])
+	ax.bxp([boxplot_stats_from_histogram(histogram[i], edges, i) for i in relevant_truth])
 	plt.ylabel("Switching activity")
 	plt.xlabel("Truth density")
-	plt.savefig(f"switching_per_truth_density_k_{k}_boxplot.pdf", bbox_inches='tight', pad_inches=0)
\ No newline at end of file
+	plt.savefig(f"switching_per_truth_density_k_{k}_boxplot.pdf", bbox_inches='tight', pad_inches=0)
+
+
+def truth_k_histogram_star(args):
+	return truth_k_histogram(*args)
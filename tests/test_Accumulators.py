@@ -0,0 +1,62 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import numpy as np
+from src.Accumulators import *
+
+def accumulate(accumulator, values, splits):
+    # each part is accumulated on its own, then parts are merged, as shards of the samples are
+    parts = [type(accumulator)() for _ in range(len(splits) + 1)]
+    for part, chunk in zip(parts, np.split(values, splits)):
+        for stream in np.array_split(chunk, 3):
+            part.update(stream)
+    for part in parts:
+        accumulator.merge(part)
+    return accumulator
+
+def test_mean_and_variance_on_split_streams():
+    rng = np.random.default_rng(0)
+    values = rng.normal(10, 3, 1000)
+    for splits in ([], [1], [500], [3, 400, 401, 999]):
+        mean = accumulate(MeanAccumulator(), values, splits)
+        assert mean.n == len(values)
+        assert np.isclose(mean.value(), np.mean(values)) and np.isclose(mean.variance(), np.var(values))
+        assert np.isclose(accumulate(VarianceAccumulator(), values, splits).value(), np.var(values))
+
+def test_empty_parts():
+    values = np.arange(10, dtype = float)
+    mean = MeanAccumulator()
+    mean.update([])
+    mean.merge(MeanAccumulator())
+    mean.update(values)
+    assert mean.n == 10 and np.isclose(mean.value(), 4.5) and np.isclose(mean.variance(), np.var(values))
+
+def test_max():
+    rng = np.random.default_rng(1)
+    values = rng.integers(0, 1000, 777)
+    assert accumulate(MaxAccumulator(), values, [100, 200]).value() == values.max()
+
+def test_lower_bounds():
+    values = np.abs(np.random.default_rng(2).normal(0, 1, 200))
+    mean = MeanAccumulator(nonnegative = True)
+    mean.update(values[:20])
+    # too few samples for the confidence bound: the proven one holds, whatever the remaining samples are
+    assert np.isclose(mean.lower_bound(200, 3), np.sum(values[:20]) / 200)
+    assert mean.lower_bound(200, 3) <= np.mean(np.concatenate([values[:20], np.zeros(180)]))
+    mean.update(values[20:])
+    assert np.isclose(mean.lower_bound(200, 3), np.mean(values))
+    assert MeanAccumulator().lower_bound(200, 3) == -np.inf
+    assert VarianceAccumulator().lower_bound(200, 3) == -np.inf
@@ -0,0 +1,59 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import io, json, random
+from pyalslib import ALSCatalogCache, negate
+from src.CatalogQuery import *
+
+def catalog_cache(path):
+    rng = random.Random(0)
+    cache = ALSCatalogCache(str(path))
+    cache.init()
+    specs = ["".join(rng.choice("01") for _ in range(8)) for _ in range(20)]
+    for spec in specs:
+        for dist in range(rng.randint(1, 4)):
+            gates = rng.randint(0, 3)
+            S, P = [[rng.randint(0, 5) for _ in range(gates)] for _ in range(2)], [[rng.randint(0, 1) for _ in range(gates)] for _ in range(2)]
+            cache.add_lut(spec, dist, "".join(rng.choice("01") for _ in spec), S, P, rng.randint(0, 1), rng.randint(0, 5), rng.randint(0, 3))
+    # both a specification and its complement in the cache: the direct one is returned
+    cache.add_lut(negate(specs[0]), 0, negate(specs[0]), [[], []], [[], []], 0, 0, 0)
+    return cache, specs
+
+def test_batch_against_get_lut_at_dist(tmp_path):
+    cache, specs = catalog_cache(tmp_path / "cache.db")
+    rng = random.Random(1)
+    queries = [(spec, rng.randint(0, 4), rng.random() < 0.5) for spec in specs + ["01" * 4] for _ in range(5)]
+    lines = [json.dumps({"spec": s, "dist": d, "neg": n}) if i % 2 else f"{s} {d} {'neg' if n else 0}" for i, (s, d, n) in enumerate(queries)]
+    out = io.StringIO()
+    # batches smaller than the queries, so that the temporary table is reused
+    assert CatalogQuery(str(tmp_path / "cache.db"), batch_size = 7).answer(io.StringIO("\n".join(["# comment", ""] + lines)), out) == len(queries)
+    answers = [json.loads(line) for line in out.getvalue().splitlines()]
+    found = 0
+    for (spec, dist, neg), answer in zip(queries, answers):
+        expected = cache.get_lut_at_dist(negate(spec) if neg else spec, dist)
+        assert (answer["spec"], answer["dist"], answer["neg"]) == (spec, dist, neg)
+        assert answer["found"] == (expected is not None)
+        if expected is not None:
+            assert [answer[k] for k in ("synth_spec", "S", "P", "out_p", "out", "depth")] == list(expected)
+            found += 1
+    assert 0 < found < len(queries)
+    for neg in (False, True):
+        spec = negate(specs[0]) if neg else specs[0]
+        assert list(next(CatalogQuery(str(tmp_path / "cache.db")).query([(spec, 0)]))) == list(cache.get_lut_at_dist(spec, 0))
+
+def test_parse_queries():
+    lines = ["0110", "0110 2", "0110 3 neg", '{"spec": "0001", "dist": 1, "neg": true}', '{"spec": "0001"}', "   ", "# 0110 1"]
+    assert list(CatalogQuery.parse_queries(lines)) == [("0110", 0, False), ("0110", 2, False), ("0110", 3, True), ("0001", 1, True), ("0001", 0, False)]
@@ -0,0 +1,51 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import numpy as np
+from src.SampleSet import *
+
+def test_pack_unpack_roundtrip():
+    rng = np.random.default_rng(0)
+    for width in (1, 7, 8, 9, 23, 64):
+        bits = rng.integers(0, 2, (100, width)).astype(bool)
+        packed = pack(bits)
+        assert packed.shape == (100, (width + 7) // 8)
+        assert np.array_equal(unpack(packed, width), bits)
+
+def test_columns_and_dicts():
+    rng = np.random.default_rng(1)
+    pi_names, po_names = [f"a{i}" for i in range(11)], [f"s{i}" for i in range(5)]
+    input_bits, output_bits = rng.integers(0, 2, (50, 11)).astype(bool), rng.integers(0, 2, (50, 5)).astype(bool)
+    samples = SampleSet.from_bits(pi_names, po_names, input_bits, output_bits)
+    assert np.array_equal(samples.input_bits(), input_bits) and np.array_equal(samples.output_bits(), output_bits)
+    for i, n in enumerate(pi_names):
+        assert np.array_equal(samples.input_column(n), input_bits[:, i])
+    for i, n in enumerate(po_names):
+        assert np.array_equal(samples.output_column(n), output_bits[:, i])
+    dicts = samples.to_dicts()
+    assert dicts[3] == {"input": dict(zip(pi_names, input_bits[3].tolist())), "output": dict(zip(po_names, output_bits[3].tolist()))}
+    again = SampleSet.from_dicts(dicts, pi_names, po_names)
+    assert np.array_equal(again.inputs, samples.inputs) and np.array_equal(again.outputs, samples.outputs)
+
+def test_values_and_shards():
+    pi_names, po_names = ["a0", "a1", "a2"], ["s0", "s1"]
+    input_bits = [[(v >> i) & 1 for i in range(3)] for v in range(8)]
+    samples = SampleSet.from_bits(pi_names, po_names, input_bits, [[(v >> i) & 1 for i in range(2)] for v in range(8)])
+    assert samples.input_values({"a0": 1, "a1": 2, "a2": 4}).tolist() == list(range(8))
+    assert samples.output_values({"s0": 1, "s1": 2}).tolist() == [v % 4 for v in range(8)]
+    shards = samples.shard(3)
+    assert sum(len(s) for s in shards) == 8
+    assert np.array_equal(np.concatenate([s.inputs for s in shards]), samples.inputs)
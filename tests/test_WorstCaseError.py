@@ -0,0 +1,99 @@
+"""
+Copyright 2021-2025 Salvatore Barone <salvatore.barone@unina.it>
+
+This is free software; you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free
+Software Foundation; either version 3 of the License, or any later version.
+
+This is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with
+RMEncoder; if not, write to the Free Software Foundation, Inc., 51 Franklin
+Street, Fifth Floor, Boston, MA 02110-1301, USA.
+"""
+import itertools, random, igraph
+from pyalslib import ALSGraph
+from src.WorstCaseError import *
+
+class AdderGraph:
+    """
+    n-bit ripple-carry adder made of LUT cells, exposing the part of the ALSGraph interface the simulator reads.
+    """
+    def __init__(self, n):
+        self.graph = igraph.Graph(directed = True)
+        self.add(ALSGraph.VertexType.CONSTANT_ZERO, "Constant 0")
+        a = [self.add(ALSGraph.VertexType.PRIMARY_INPUT, f"\\a[{i}]") for i in range(n)]
+        b = [self.add(ALSGraph.VertexType.PRIMARY_INPUT, f"\\b[{i}]") for i in range(n)]
+        carry, outputs = None, []
+        for i in range(n):
+            fanin = (a[i], b[i]) if carry is None else (a[i], b[i], carry)
+            outputs.append(self.add(ALSGraph.VertexType.CELL, f"s{i}", "0110" if carry is None else "01101001", fanin))
+            carry = self.add(ALSGraph.VertexType.CELL, f"c{i}", "0001" if carry is None else "00010111", fanin)
+        outputs.append(carry)
+        for i, o in enumerate(outputs):
+            self.add(ALSGraph.VertexType.PRIMARY_OUTPUT, f"\\s[{i}]", None, (o,))
+
+    def add(self, type, name, spec = None, fanin = ()):
+        self.graph.add_vertex(type = type, name = name, spec = spec, **{"in": list(fanin)})
+        for f in fanin:
+            self.graph.add_edge(f, self.graph.vcount() - 1)
+        return self.graph.vcount() - 1
+
+    def get_pi(self):
+        return [v for v in self.graph.vs if v["type"] == ALSGraph.VertexType.PRIMARY_INPUT]
+
+    def get_po(self):
+        return [v for v in self.graph.vs if v["type"] == ALSGraph.VertexType.PRIMARY_OUTPUT]
+
+    def get_cells(self):
+        return [v for v in self.graph.vs if v["type"] == ALSGraph.VertexType.CELL]
+
+    def value(self, inputs, configuration, weights):
+        # vertices are added in topological order
+        signals = {}
+        for v in self.graph.vs:
+            if v["type"] == ALSGraph.VertexType.CONSTANT_ZERO:
+                signals[v.index] = False
+            elif v["type"] == ALSGraph.VertexType.PRIMARY_INPUT:
+                signals[v.index] = inputs[v["name"]]
+            elif v["type"] == ALSGraph.VertexType.CELL:
+                spec = configuration[v["name"]]["axspec"]
+                signals[v.index] = spec[sum(signals[f] << i for i, f in enumerate(v["in"]))] == "1"
+            else:
+                signals[v.index] = signals[v["in"][0]]
+        return sum(weights[v["name"]] for v in self.get_po() if signals[v.index])
+
+def exhaustive(graph, configuration, weights):
+    # AWCE and WRE by enumeration of all the input vectors
+    exact = {c["name"]: {"spec": c["spec"], "axspec": c["spec"]} for c in graph.get_cells()}
+    names = [v["name"] for v in graph.get_pi()]
+    awce = wre = 0
+    for bits in itertools.product([False, True], repeat = len(names)):
+        f, axf = graph.value(dict(zip(names, bits)), exact, weights), graph.value(dict(zip(names, bits)), configuration, weights)
+        awce = max(awce, abs(f - axf))
+        wre = max(wre, abs(f - axf) / (f if f != 0 else 1))
+    return awce, wre
+
+def test_against_exhaustive_enumeration():
+    graph = AdderGraph(3)
+    rng = random.Random(0)
+    approximate = 0
+    for weights in ({v["name"]: 2 ** i for i, v in enumerate(graph.get_po())}, {v["name"]: 2 ** i / 4 for i, v in enumerate(graph.get_po())}):
+        formal = WorstCaseError(graph, weights)
+        for _ in range(20):
+            # a few cells are replaced by random truth tables
+            configuration = {c["name"]: {"spec": c["spec"], "axspec": c["spec"] if rng.random() < 0.6 else "".join(rng.choice("01") for _ in c["spec"])} for c in graph.get_cells()}
+            awce, wre = exhaustive(graph, configuration, weights)
+            assert formal.awce(configuration) == awce
+            approximate += awce > 0
+            assert abs(formal.wre(configuration) - wre) <= max(wre, 1) * 2 ** -20
+    assert approximate > 20
+
+def test_exact_configuration():
+    graph = AdderGraph(2)
+    formal = WorstCaseError(graph, {v["name"]: 2 ** i for i, v in enumerate(graph.get_po())})
+    configuration = {c["name"]: {"spec": c["spec"], "axspec": c["spec"]} for c in graph.get_cells()}
+    assert formal.awce(configuration) == 0 and formal.wre(configuration) == 0